@@ -120,6 +120,23 @@ DEFAULTS = {
     "search_engine": "duckduckgo",
 }
 
+# ============================================================
+# REQUEST HEDGING
+# ============================================================
+# Kirim ke 2 provider teratas sekaligus, ambil yang sukses duluan.
+# Default OFF — biaya request bisa 2x (jangan aktifkan di free tier ketat).
+
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "false").lower() in ("1", "true", "yes")
+HEDGE_MODES = {"reasoning", "search"}
+
+# ============================================================
+# SEMANTIC RESPONSE CACHE
+# ============================================================
+# Tier paraphrase di atas exact cache (butuh fastembed + numpy).
+# Default OFF — jawaban mirip belum tentu benar untuk pertanyaan yang beda tipis.
+
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "false").lower() in ("1", "true", "yes")
+
 # ============================================================
 # PROVIDER REGISTRY
 # ============================================================
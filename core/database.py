@@ -7,7 +7,7 @@ import json
 import logging
 import os
 import sqlite3
-from typing import Dict, List
+from typing import Dict, List, Optional
 from datetime import datetime
 
 log = logging.getLogger(__name__)
@@ -391,6 +391,11 @@ def get_memory_stats(guild_id: int) -> dict:
 
 class SettingsManager:
     _cache: Dict[int, dict] = {}
+    _version: Dict[int, int] = {}  # naik tiap save/reset, dipakai handler untuk invalidasi routing table
+
+    @classmethod
+    def version(cls, guild_id: int) -> int:
+        return cls._version.get(guild_id, 0)
 
     @classmethod
     def get(cls, guild_id: int) -> dict:
@@ -402,11 +407,13 @@ class SettingsManager:
     def save(cls, guild_id: int):
         if guild_id in cls._cache:
             save_settings(guild_id, cls._cache[guild_id])
+            cls._version[guild_id] = cls._version.get(guild_id, 0) + 1
 
     @classmethod
     def reset(cls, guild_id: int):
         cls._cache[guild_id] = json.loads(json.dumps(DEFAULT_SETTINGS))
         save_settings(guild_id, cls._cache[guild_id])
+        cls._version[guild_id] = cls._version.get(guild_id, 0) + 1
 
     @classmethod
     def get_all_guilds(cls) -> list:
@@ -549,49 +556,136 @@ def get_due_reminders() -> list:
     return due
 
 
-def mark_reminder_triggered(reminder_id: int, reschedule: bool = False):
+def get_next_reminder_time() -> Optional[float]:
+    """Epoch (UTC) reminder aktif paling dekat, None kalau tidak ada.
+    Tidak pakai MIN(next_trigger): string ISO dengan offset timezone berbeda tidak urut secara leksikal"""
     import pytz
-    from datetime import timedelta
 
     conn = _get_conn()
     c = conn.cursor()
+    c.execute('SELECT next_trigger, timezone FROM reminders WHERE is_active = 1 AND next_trigger IS NOT NULL')
+    rows = c.fetchall()
+    conn.close()
+
+    earliest = None
+    for next_trigger, timezone in rows:
+        try:
+            when = datetime.fromisoformat(next_trigger)
+            if when.tzinfo is None:
+                when = pytz.timezone(timezone or "Asia/Jakarta").localize(when)
+            ts = when.timestamp()
+        except Exception:
+            continue
+        if earliest is None or ts < earliest:
+            earliest = ts
+    return earliest
+
+
+def _next_recurring_trigger(reminder: dict) -> Optional[str]:
+    """next_trigger baru (ISO) untuk reminder daily/weekly, None kalau bukan recurring"""
+    import pytz
+    from datetime import timedelta
+
+    try:
+        tz = pytz.timezone(reminder.get("timezone", "Asia/Jakarta"))
+    except:
+        tz = pytz.timezone("Asia/Jakarta")
+
+    if reminder["trigger_type"] == "daily" and reminder.get("trigger_time"):
+        hour, minute = map(int, str(reminder["trigger_time"]).split(":"))
+        next_t = datetime.now(tz).replace(hour=hour, minute=minute, second=0) + timedelta(days=1)
+        return next_t.isoformat()
+    elif reminder["trigger_type"] == "weekly":
+        next_t = datetime.fromisoformat(reminder["next_trigger"])
+        if next_t.tzinfo is None:
+            next_t = tz.localize(next_t)
+        return (next_t + timedelta(weeks=1)).isoformat()
+    return None
+
+
+def _triggered_sets(results: list) -> tuple:
+    """SET clause + params untuk menandai reminder triggered: recurring → next_trigger baru, sisanya is_active=0"""
+    import pytz
+
     now = datetime.now(pytz.UTC).isoformat()
+    reschedules, deactivate = [], []
+    for reminder, reschedule in results:
+        try:
+            next_t = _next_recurring_trigger(reminder) if reschedule else None
+        except Exception as e:
+            # Satu row rusak (trigger_time "08:00:00", next_trigger NULL, ...) tidak boleh
+            # menggagalkan UPDATE seluruh batch → row itu dinonaktifkan saja
+            log.error(f"⏰ Cannot reschedule reminder #{reminder['id']}, deactivating: {e}")
+            next_t = None
+        if next_t:
+            reschedules.append((reminder["id"], next_t))
+        else:
+            deactivate.append(reminder["id"])
+
+    sets = ["last_triggered=?"]
+    params: list = [now]
+    if reschedules:
+        sets.append("next_trigger = CASE id " + " ".join(["WHEN ? THEN ?"] * len(reschedules)) + " ELSE next_trigger END")
+        for rid, next_t in reschedules:
+            params += [rid, next_t]
+    if deactivate:
+        sets.append(f"is_active = CASE WHEN id IN ({','.join('?' * len(deactivate))}) THEN 0 ELSE is_active END")
+        params += deactivate
+    return ", ".join(sets), params
+
+
+def claim_due_reminders(reminders: list) -> list:
+    """Klaim reminder due secara atomik SEBELUM dieksekusi (satu UPDATE ... RETURNING).
+    Row hanya ter-update kalau masih aktif dan next_trigger-nya belum diubah instance lain,
+    jadi dua scheduler tidak bisa menembak reminder yang sama. Returns row yang berhasil diklaim"""
+    if not reminders:
+        return []
+
+    sets, params = _triggered_sets(
+        [(r, r["trigger_type"] in ("daily", "weekly")) for r in reminders])
+    guard = " OR ".join(["(id = ? AND next_trigger IS ?)"] * len(reminders))
+    for r in reminders:
+        params += [r["id"], r["next_trigger"]]
 
+    conn = _get_conn()
+    c = conn.cursor()
+    c.execute(f"UPDATE reminders SET {sets} WHERE is_active = 1 AND ({guard}) RETURNING id", params)
+    claimed = {row[0] for row in c.fetchall()}
+    conn.commit()
+    conn.close()
+    return [r for r in reminders if r["id"] in claimed]
+
+
+def mark_reminders_triggered(results: list):
+    """Tandai banyak reminder sekaligus dalam SATU UPDATE (satu round-trip Turso).
+    results: [(reminder_row_dict, reschedule), ...] — row dari get_due_reminders, jadi tidak perlu SELECT ulang"""
+    if not results:
+        return
+
+    sets, params = _triggered_sets(results)
+    ids = [reminder["id"] for reminder, _ in results]
+    params += ids
+
+    conn = _get_conn()
+    c = conn.cursor()
+    c.execute(f"UPDATE reminders SET {sets} WHERE id IN ({','.join('?' * len(ids))})", params)
+    conn.commit()
+    conn.close()
+
+
+def mark_reminder_triggered(reminder_id: int, reschedule: bool = False):
+    reminder = {"id": reminder_id}
     if reschedule:
+        conn = _get_conn()
+        c = conn.cursor()
         c.execute('SELECT * FROM reminders WHERE id = ?', (reminder_id,))
         row = c.fetchone()
         if row:
-            columns = [desc[0] for desc in c.description]
-            reminder = dict(zip(columns, row))
-
-            try:
-                tz = pytz.timezone(reminder.get("timezone", "Asia/Jakarta"))
-            except:
-                tz = pytz.timezone("Asia/Jakarta")
-
-            now_local = datetime.now(tz)
-
-            if reminder["trigger_type"] == "daily" and reminder.get("trigger_time"):
-                hour, minute = map(int, str(reminder["trigger_time"]).split(":"))
-                next_t = now_local.replace(hour=hour, minute=minute, second=0) + timedelta(days=1)
-                c.execute('UPDATE reminders SET last_triggered=?, next_trigger=? WHERE id=?',
-                         (now, next_t.isoformat(), reminder_id))
-            elif reminder["trigger_type"] == "weekly":
-                next_t = datetime.fromisoformat(reminder["next_trigger"])
-                if next_t.tzinfo is None:
-                    next_t = tz.localize(next_t)
-                next_t += timedelta(weeks=1)
-                c.execute('UPDATE reminders SET last_triggered=?, next_trigger=? WHERE id=?',
-                         (now, next_t.isoformat(), reminder_id))
-            else:
-                c.execute('UPDATE reminders SET is_active=0, last_triggered=? WHERE id=?',
-                         (now, reminder_id))
-    else:
-        c.execute('UPDATE reminders SET is_active=0, last_triggered=? WHERE id=?',
-                 (now, reminder_id))
-
-    conn.commit()
-    conn.close()
+            reminder = dict(zip([desc[0] for desc in c.description], row))
+        else:
+            reschedule = False
+        conn.close()
+    mark_reminders_triggered([(reminder, reschedule)])
 
 
 def get_user_reminders(guild_id: int, user_id: int) -> list:
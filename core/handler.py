@@ -5,20 +5,27 @@ import json
 import math
 import logging
 import re
+import sys
 import asyncio
 import aiohttp
 import os
 import tempfile
 import shutil
-from typing import Dict, List, Optional
+import hashlib
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Optional
 from datetime import datetime, timedelta
-from core.providers import ProviderFactory, AIResponse
+from core.providers import ProviderFactory, AIResponse, get_session
+from core.semantic_cache import semantic_cache
 from core.database import (
     save_message, get_conversation, clear_conversation,
     get_memory_stats, MAX_MEMORY_MESSAGES,
-    get_user_location
+    get_user_location, SettingsManager
 )
-from config import API_KEYS, FALLBACK_CHAINS, PROVIDERS
+from config import API_KEYS, FALLBACK_CHAINS, PROVIDERS, HEDGE_REQUESTS, HEDGE_MODES
 
 log = logging.getLogger(__name__)
 
@@ -41,56 +48,238 @@ def is_admin(user_id: int) -> bool:
 # REQUEST LOGS
 # ============================================================
 
-request_logs: List[Dict] = []
 MAX_LOGS = 500
+request_logs: "deque[Dict]" = deque(maxlen=MAX_LOGS)  # entry tertua otomatis dibuang, O(1)
 
 def _log_request(guild_id, provider, model, success, latency, is_fallback=False, error=None):
     request_logs.append({"guild_id": guild_id, "provider": provider, "model": model, "success": success, "latency": latency, "is_fallback": is_fallback, "error": error, "time": datetime.now().strftime("%H:%M:%S")})
-    if len(request_logs) > MAX_LOGS:
-        request_logs.pop(0)
+
+# ============================================================
+# RESPONSE CACHE — exact match (mode, route, guild/channel/user, content)
+# ============================================================
+
+_RESP_CACHE: "OrderedDict[tuple, str]" = OrderedDict()
+_RESP_CACHE_MAX = 2048
+_RESP_CACHE_MIN_CHARS = 20   # "ok", "lanjutkan", "jelaskan lagi" → selalu tergantung konteks
+_NO_CACHE_RE = re.compile(r'hari ini|today|sekarang|\bnow\b|besok|kemarin|\b\d{4}\b|https?://', re.IGNORECASE)
+# Prompt yang merujuk ke percakapan sebelumnya → jawabannya bergantung history, jangan di-cache
+_FOLLOWUP_RE = re.compile(
+    r'\b(?:tadi|barusan|sebelumnya|di atas|lanjut\w*|lagi|yang itu|previous|above|earlier|again|continue)\b',
+    re.IGNORECASE)
+
+def _normalize_prompt(content: str) -> str:
+    return " ".join(content.lower().split())
+
+def _resp_cache_key(mode: str, provider: str, model: str, content: str,
+                    guild_id: int, channel_id: int, user_id: int) -> Optional[tuple]:
+    """None = jangan di-cache (search mode / prompt pendek / follow-up / time-sensitive).
+    History sengaja tidak masuk key: tiap balasan di-save ke history, jadi pertanyaan yang sama
+    di turn berikutnya tidak akan pernah hit. Prompt yang bergantung konteks disaring _FOLLOWUP_RE"""
+    norm = _normalize_prompt(content)
+    if (mode == "search" or len(norm) < _RESP_CACHE_MIN_CHARS
+            or _NO_CACHE_RE.search(content) or _FOLLOWUP_RE.search(content)):
+        return None
+    return (mode, provider, model, guild_id, channel_id, user_id,
+            hashlib.blake2b(norm.encode(), digest_size=16).digest())
+
+def _semantic_route(key: tuple) -> tuple:
+    """Route semantic tier: (mode, provider, model, guild, channel, user) — tanpa hash konten"""
+    return key[:6]
+
+async def _resp_cache_get(key: Optional[tuple], content: str) -> Optional[str]:
+    """Exact match dulu, lalu semantic tier (paraphrase) kalau tersedia"""
+    if key is None:
+        return None
+    text = _RESP_CACHE.get(key)
+    if text is not None:
+        _RESP_CACHE.move_to_end(key)
+        return text
+    text = await semantic_cache.get(_semantic_route(key), content)
+    if text is not None:
+        _RESP_CACHE[key] = text
+    return text
+
+async def _resp_cache_put(key: Optional[tuple], content: str, text: str):
+    if key is None or not text:
+        return
+    _RESP_CACHE[key] = text
+    _RESP_CACHE.move_to_end(key)
+    if len(_RESP_CACHE) > _RESP_CACHE_MAX:
+        _RESP_CACHE.popitem(last=False)
+    await semantic_cache.put(_semantic_route(key), content, text)
+
+_THINK_BLOCK = re.compile(r'<(think|thinking|thought)>.*?</\1>', re.DOTALL)
+_THINK_STRAY = re.compile(r'</?(?:think|thinking|thought)>')
+_NL = re.compile(r'\n{3,}')
+_NL_COLLAPSE = '\n\n'
 
 def strip_think_tags(content: str) -> str:
-    for tag in ['think', 'thinking', 'thought']:
-        content = re.sub(rf'<{tag}>.*?</{tag}>', '', content, flags=re.DOTALL)
-        content = re.sub(rf'</?{tag}>', '', content)
-    return re.sub(r'\n{3,}', '\n\n', content).strip()
+    # Fast path: mayoritas respons tidak punya tag sama sekali
+    if ("<think" not in content and "</think" not in content
+            and "<thought" not in content and "</thought" not in content):
+        return _NL.sub(_NL_COLLAPSE, content).strip()
+    content = _THINK_BLOCK.sub('', content)
+    content = _THINK_STRAY.sub('', content)
+    return _NL.sub(_NL_COLLAPSE, content).strip()
+
+_THINK_PAIRS = {"<think>": "</think>", "<thinking>": "</thinking>", "<thought>": "</thought>"}
+_THINK_TAGS = tuple(_THINK_PAIRS) + tuple(_THINK_PAIRS.values())
+_WS_RUN = re.compile(r'\s+\Z')
+
+def _partial_tag(rest: str, tags: tuple) -> bool:
+    return any(t.startswith(rest) for t in tags)
+
+class ThinkStripper:
+    """Incremental versi strip_think_tags untuk streaming — feed(chunk) → teks yang aman ditampilkan.
+    "".join(feed(c) for c in chunks) + flush() == strip_think_tags("".join(chunks)).
+
+    Tiga tahap, sama urutannya dengan versi batch:
+      1. blok <think>…</think> berpasangan dibuang (isi blok ditahan sampai close tag datang;
+         kalau tidak pernah ditutup, flush() mengembalikan isinya seperti regex batch)
+      2. tag think yang tersisa (stray / tidak berpasangan) dibuang
+      3. whitespace: \\n{3,} → \\n\\n, leading/trailing di-strip (trailing ditahan sampai ada teks)
+    """
+    __slots__ = ("open_tag", "close_tag", "held", "scan", "buf1", "buf2", "ws", "started")
+
+    def __init__(self):
+        self.open_tag = self.close_tag = None   # blok yang sedang terbuka
+        self.held = ""      # isi blok yang belum ditutup
+        self.scan = 0       # posisi cari close tag berikutnya di held
+        self.buf1 = ""      # open tag terpotong di akhir chunk (tahap 1)
+        self.buf2 = ""      # tag terpotong (tahap 2)
+        self.ws = ""        # trailing whitespace yang ditahan (tahap 3)
+        self.started = False
+
+    # --- tahap 1: blok berpasangan ---
+    def _blocks(self, data: str) -> str:
+        out = []
+        data, self.buf1 = self.buf1 + data, ""
+        while data:
+            if self.open_tag:
+                self.held += data
+                j = self.held.find(self.close_tag, self.scan)
+                if j == -1:
+                    self.scan = max(0, len(self.held) - len(self.close_tag) + 1)
+                    break
+                data = self.held[j + len(self.close_tag):]
+                self.open_tag = self.close_tag = None
+                self.held, self.scan = "", 0
+                continue
+            j = data.find("<")
+            if j == -1:
+                out.append(data)
+                break
+            out.append(data[:j])
+            rest = data[j:]
+            tag = next((t for t in _THINK_PAIRS if rest.startswith(t)), None)
+            if tag:
+                self.open_tag, self.close_tag = tag, _THINK_PAIRS[tag]
+                data = rest[len(tag):]
+            elif _partial_tag(rest, tuple(_THINK_PAIRS)):
+                self.buf1 = rest
+                break
+            else:
+                out.append("<")
+                data = rest[1:]
+        return "".join(out)
+
+    def _blocks_flush(self) -> str:
+        if self.open_tag:
+            # Tidak pernah ditutup → regex batch tidak match: tag tetap (dibuang tahap 2), isi diproses ulang
+            tag, held = self.open_tag, self.held
+            self.open_tag = self.close_tag = None
+            self.held, self.scan = "", 0
+            return tag + self._blocks(held) + self._blocks_flush()
+        rest, self.buf1 = self.buf1, ""
+        return rest
+
+    # --- tahap 2: stray tag ---
+    def _stray(self, data: str) -> str:
+        out = []
+        data, self.buf2 = self.buf2 + data, ""
+        while data:
+            j = data.find("<")
+            if j == -1:
+                out.append(data)
+                break
+            out.append(data[:j])
+            rest = data[j:]
+            tag = next((t for t in _THINK_TAGS if rest.startswith(t)), None)
+            if tag:
+                data = rest[len(tag):]
+            elif _partial_tag(rest, _THINK_TAGS):
+                self.buf2 = rest
+                break
+            else:
+                out.append("<")
+                data = rest[1:]
+        return "".join(out)
+
+    # --- tahap 3: whitespace ---
+    def _space(self, data: str) -> str:
+        if not self.started:
+            data = data.lstrip()
+            if not data:
+                return ""
+            self.started = True
+        data = self.ws + data
+        m = _WS_RUN.search(data)
+        if m:
+            data, self.ws = data[:m.start()], m.group(0)
+        else:
+            self.ws = ""
+        return _NL.sub(_NL_COLLAPSE, data)
+
+    def feed(self, chunk: str) -> str:
+        return self._space(self._stray(self._blocks(chunk)))
+
+    def flush(self) -> str:
+        text = self._stray(self._blocks_flush())
+        text += self.buf2
+        self.buf2 = ""
+        out = self._space(text)
+        self.ws, self.started = "", False
+        return out
 
 # ============================================================
 # SEARCH — Tavily first, DuckDuckGo fallback
 # ============================================================
 
+# DDGS blocking → pool sendiri supaya tidak menghabiskan default executor
+_SEARCH_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ddg")
+
 async def do_search(query: str, engine: str = "auto") -> str:
     tavily_key = API_KEYS.get("tavily")
     if tavily_key:
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    "https://api.tavily.com/search",
-                    json={
-                        "api_key": tavily_key,
-                        "query": query,
-                        "max_results": 5,
-                        "search_depth": "basic",
-                        "include_answer": True,
-                    },
-                    timeout=aiohttp.ClientTimeout(total=15)
-                ) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        parts = []
-                        if data.get("answer"):
-                            parts.append(f"Summary: {data['answer']}")
-                        for i, r in enumerate(data.get("results", []), 1):
-                            parts.append(
-                                f"{i}. {r.get('title', 'No title')}\n"
-                                f"   {r.get('content', '')[:200]}\n"
-                                f"   {r.get('url', '')}"
-                            )
-                        if parts:
-                            log.info(f"🔍 Tavily search OK: {query}")
-                            return "\n\n".join(parts)
-                    else:
-                        log.warning(f"Tavily HTTP {resp.status}, fallback to DuckDuckGo")
+            session = await get_session()
+            async with session.post(
+                "https://api.tavily.com/search",
+                json={
+                    "api_key": tavily_key,
+                    "query": query,
+                    "max_results": 5,
+                    "search_depth": "basic",
+                    "include_answer": True,
+                },
+                timeout=aiohttp.ClientTimeout(total=15)
+            ) as resp:
+                if resp.status == 200:
+                    data = await resp.json()
+                    parts = []
+                    if data.get("answer"):
+                        parts.append(f"Summary: {data['answer']}")
+                    for i, r in enumerate(data.get("results", []), 1):
+                        parts.append(
+                            f"{i}. {r.get('title', 'No title')}\n"
+                            f"   {r.get('content', '')[:200]}\n"
+                            f"   {r.get('url', '')}"
+                        )
+                    if parts:
+                        log.info(f"🔍 Tavily search OK: {query}")
+                        return "\n\n".join(parts)
+                else:
+                    log.warning(f"Tavily HTTP {resp.status}, fallback to DuckDuckGo")
         except Exception as e:
             log.warning(f"Tavily error, fallback to DuckDuckGo: {e}")
 
@@ -99,7 +288,7 @@ async def do_search(query: str, engine: str = "auto") -> str:
         def _s():
             with DDGS() as d:
                 return list(d.text(query, max_results=5))
-        results = await asyncio.get_event_loop().run_in_executor(None, _s)
+        results = await asyncio.get_running_loop().run_in_executor(_SEARCH_POOL, _s)
         if not results:
             return "Tidak ada hasil."
         log.info(f"🔍 DuckDuckGo search OK: {query}")
@@ -110,8 +299,41 @@ async def do_search(query: str, engine: str = "auto") -> str:
     except Exception as e:
         return f"Search error: {e}"
 
-GROUNDING_MODELS = {("groq", "groq/compound"), ("groq", "groq/compound-mini"), ("groq", "compound-beta"), ("groq", "compound-beta-mini"), ("pollinations", "gemini-search"), ("pollinations", "perplexity-fast"), ("pollinations", "perplexity-reasoning")}
-def is_grounding_model(p, m): return (p, m) in GROUNDING_MODELS
+GROUNDING_MODELS = frozenset({("groq", "groq/compound"), ("groq", "groq/compound-mini"), ("groq", "compound-beta"), ("groq", "compound-beta-mini"), ("pollinations", "gemini-search"), ("pollinations", "perplexity-fast"), ("pollinations", "perplexity-reasoning")})
+GROUNDING_KEYS = frozenset(sys.intern(f"{p}:{m}") for p, m in GROUNDING_MODELS)
+def is_grounding_model(p, m): return f"{p}:{m}" in GROUNDING_KEYS
+
+# ============================================================
+# ROUTING TABLE (per guild, dibangun ulang hanya saat settings disimpan)
+# ============================================================
+
+@dataclass(frozen=True)
+class RoutingPlan:
+    provider: str
+    model: str
+    engine: str
+    grounding: bool
+
+DEFAULT_ROUTE = RoutingPlan("groq", "llama-3.3-70b-versatile", "duckduckgo", False)
+
+def build_routing_table(settings: Dict) -> Dict[str, RoutingPlan]:
+    table = {}
+    for mode, profile in settings.get("profiles", {}).items():
+        prov = profile.get("provider", DEFAULT_ROUTE.provider)
+        mid = profile.get("model", DEFAULT_ROUTE.model)
+        table[mode] = RoutingPlan(prov, mid, profile.get("engine", DEFAULT_ROUTE.engine), is_grounding_model(prov, mid))
+    return table
+
+_ROUTING_CACHE: Dict[int, tuple] = {}  # guild_id -> (settings version, profiles obj, table)
+
+def get_routing_plan(settings: Dict, mode: str) -> RoutingPlan:
+    guild_id = settings.get("guild_id", 0)
+    version, profiles = SettingsManager.version(guild_id), settings.get("profiles")
+    cached = _ROUTING_CACHE.get(guild_id)
+    if cached is None or cached[0] != version or cached[1] is not profiles:
+        cached = (version, profiles, build_routing_table(settings))
+        _ROUTING_CACHE[guild_id] = cached
+    return cached[2].get(mode, DEFAULT_ROUTE)
 
 # ============================================================
 # TRANSLATE — AI-powered natural translation
@@ -149,18 +371,21 @@ async def do_translate(text: str, target_lang: str, style: str = "natural") -> s
         ("pollinations", "openai-fast"),
     ]
 
+    targets = []
     for prov_name, model_id in translate_chains:
         prov = ProviderFactory.get(prov_name, API_KEYS)
-        if not prov or not await prov.health_check():
-            continue
-        try:
-            resp = await prov.chat(messages, model_id, temperature=0.3, max_tokens=2048)
-            if resp.success and resp.content.strip():
-                log.info(f"🌐 Translated via {prov_name}/{model_id}")
-                return resp.content.strip()
-        except Exception as e:
-            log.warning(f"Translate error {prov_name}: {e}")
-            continue
+        if prov and await prov.health_check():
+            targets.append((prov_name, model_id))
+
+    # 2 jalan paralel; yang gagal langsung diganti target berikutnya, pemenang cancel sisanya
+    winner, resp, failed = await ProviderFactory.race(
+        targets, API_KEYS, messages, max_in_flight=2, temperature=0.3, max_tokens=2048
+    )
+    for i, fail in failed:
+        log.warning(f"Translate error {targets[i][0]}: {fail.error}")
+    if winner is not None and resp.content.strip():
+        log.info(f"🌐 Translated via {targets[winner][0]}/{targets[winner][1]}")
+        return resp.content.strip()
 
     return f"[Translation failed] {text}"
 
@@ -202,19 +427,19 @@ async def _fetch_via_jina(url: str) -> Optional[str]:
             "Accept": "text/markdown",
             "User-Agent": "Mozilla/5.0 (compatible; DiscordBot/1.0)"
         }
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                jina_url, headers=headers,
-                timeout=aiohttp.ClientTimeout(total=20)
-            ) as resp:
-                if resp.status == 200:
-                    content = await resp.text()
-                    if len(content) > 8000:
-                        content = content[:8000] + "\n\n[... content trimmed ...]"
-                    log.info(f"📄 Jina Reader OK: {url[:60]}")
-                    return content
-                else:
-                    log.warning(f"📄 Jina Reader HTTP {resp.status} for {url[:60]}")
+        session = await get_session()
+        async with session.get(
+            jina_url, headers=headers,
+            timeout=aiohttp.ClientTimeout(total=20)
+        ) as resp:
+            if resp.status == 200:
+                content = await resp.text()
+                if len(content) > 8000:
+                    content = content[:8000] + "\n\n[... content trimmed ...]"
+                log.info(f"📄 Jina Reader OK: {url[:60]}")
+                return content
+            else:
+                log.warning(f"📄 Jina Reader HTTP {resp.status} for {url[:60]}")
     except Exception as e:
         log.warning(f"📄 Jina Reader error: {e}")
     return None
@@ -229,30 +454,30 @@ async def _fetch_via_bs4(url: str) -> Optional[str]:
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
         }
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                url, headers=headers,
-                timeout=aiohttp.ClientTimeout(total=15),
-                allow_redirects=True
-            ) as resp:
-                if resp.status == 200:
-                    html = await resp.text()
-                    soup = BeautifulSoup(html, "html.parser")
-                    for tag in soup(["script", "style", "nav", "footer", "header", "aside", "iframe"]):
-                        tag.decompose()
-                    article = soup.find("article")
-                    if article:
-                        text = article.get_text(separator="\n", strip=True)
-                    else:
-                        main = soup.find("main") or soup.find("body")
-                        text = main.get_text(separator="\n", strip=True) if main else ""
-                    lines = [line.strip() for line in text.split("\n") if line.strip()]
-                    text = "\n".join(lines)
-                    if len(text) > 6000:
-                        text = text[:6000] + "\n\n[... content trimmed ...]"
-                    if len(text) > 100:
-                        log.info(f"📄 BS4 fetch OK: {url[:60]}")
-                        return text
+        session = await get_session()
+        async with session.get(
+            url, headers=headers,
+            timeout=aiohttp.ClientTimeout(total=15),
+            allow_redirects=True
+        ) as resp:
+            if resp.status == 200:
+                html = await resp.text()
+                soup = BeautifulSoup(html, "html.parser")
+                for tag in soup(["script", "style", "nav", "footer", "header", "aside", "iframe"]):
+                    tag.decompose()
+                article = soup.find("article")
+                if article:
+                    text = article.get_text(separator="\n", strip=True)
+                else:
+                    main = soup.find("main") or soup.find("body")
+                    text = main.get_text(separator="\n", strip=True) if main else ""
+                lines = [line.strip() for line in text.split("\n") if line.strip()]
+                text = "\n".join(lines)
+                if len(text) > 6000:
+                    text = text[:6000] + "\n\n[... content trimmed ...]"
+                if len(text) > 100:
+                    log.info(f"📄 BS4 fetch OK: {url[:60]}")
+                    return text
     except Exception as e:
         log.warning(f"📄 BS4 error: {e}")
     return None
@@ -283,12 +508,12 @@ async def _fetch_youtube_transcript(url: str) -> Optional[str]:
     parts = []
     try:
         oembed_url = f"https://www.youtube.com/oembed?url=https://www.youtube.com/watch?v={video_id}&format=json"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(oembed_url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    parts.append(f"Title: {data.get('title', 'Unknown')}")
-                    parts.append(f"Channel: {data.get('author_name', 'Unknown')}")
+        session = await get_session()
+        async with session.get(oembed_url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                parts.append(f"Title: {data.get('title', 'Unknown')}")
+                parts.append(f"Channel: {data.get('author_name', 'Unknown')}")
     except:
         pass
     try:
@@ -301,7 +526,7 @@ async def _fetch_youtube_transcript(url: str) -> Optional[str]:
             }
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 return ydl.extract_info(url, download=False)
-        info = await asyncio.get_event_loop().run_in_executor(None, _get_info)
+        info = await asyncio.get_running_loop().run_in_executor(None, _get_info)
         if info:
             if not parts:
                 parts.append(f"Title: {info.get('title', 'Unknown')}")
@@ -326,19 +551,19 @@ async def _fetch_youtube_transcript(url: str) -> Optional[str]:
                             if fmt.get("ext") == "json3":
                                 try:
                                     sub_url = fmt["url"]
-                                    async with aiohttp.ClientSession() as session:
-                                        async with session.get(sub_url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                                            if resp.status == 200:
-                                                sub_data = await resp.json()
-                                                events = sub_data.get("events", [])
-                                                words = []
-                                                for event in events:
-                                                    segs = event.get("segs", [])
-                                                    for seg in segs:
-                                                        w = seg.get("utf8", "").strip()
-                                                        if w and w != "\n":
-                                                            words.append(w)
-                                                transcript_text = " ".join(words)
+                                    session = await get_session()
+                                    async with session.get(sub_url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+                                        if resp.status == 200:
+                                            sub_data = await resp.json()
+                                            events = sub_data.get("events", [])
+                                            words = []
+                                            for event in events:
+                                                segs = event.get("segs", [])
+                                                for seg in segs:
+                                                    w = seg.get("utf8", "").strip()
+                                                    if w and w != "\n":
+                                                        words.append(w)
+                                            transcript_text = " ".join(words)
                                 except:
                                     pass
                         if transcript_text:
@@ -423,7 +648,7 @@ async def _try_ytdlp_download(url: str, original_url: str = None) -> Optional[di
                     "duration": info.get("duration", 0),
                     "original_url": original_url or url,
                 }
-        result = await asyncio.get_event_loop().run_in_executor(None, _download_direct)
+        result = await asyncio.get_running_loop().run_in_executor(None, _download_direct)
         if result and result.get("local_path") and os.path.exists(result["local_path"]):
             log.info(f"🎬 yt-dlp OK: {result['filename']} ({result.get('filesize', 0) / 1_000_000:.1f}MB)")
             return result
@@ -1045,14 +1270,20 @@ class ModeDetector:
     SEARCH_KW = ["berita terbaru", "harga sekarang", "news today", "current price", "latest news"]
     REASON_KW = ["jelaskan step by step", "hitung ", "analisis ", "solve ", "tulis kode", "write code"]
 
+    # Keyword → mode; satu regex alternation (IGNORECASE) → satu pass, tanpa lower() seluruh pesan
+    _KW_MODE = {**{kw: "reasoning" for kw in REASON_KW}, **{kw: "search" for kw in SEARCH_KW}}
+    _RE = re.compile("|".join(map(re.escape, _KW_MODE)), re.IGNORECASE)
+
     @classmethod
     def detect(cls, content):
-        lower = content.lower()
-        for kw in cls.SEARCH_KW:
-            if kw in lower: return "search"
-        for kw in cls.REASON_KW:
-            if kw in lower: return "reasoning"
-        return "normal"
+        # Satu pass; search tetap prioritas di atas reasoning
+        result = "normal"
+        for m in cls._RE.finditer(content):
+            mode = cls._KW_MODE[m.group(0).lower()]
+            if mode == "search":
+                return "search"
+            result = mode
+        return result
 
 # ============================================================
 # TOOL CALL EXECUTOR
@@ -1214,6 +1445,7 @@ async def execute_tool_call(tool_name: str, tool_args: dict) -> str:
     # ── SET REMINDER ──
     elif tool_name == "set_reminder":
         from core.database import create_reminder
+        from core.scheduler import notify_new_reminder
         message = tool_args.get("message", "Reminder!")
         trigger_type = tool_args.get("trigger_type", "minutes")
         minutes = tool_args.get("minutes")
@@ -1255,6 +1487,7 @@ async def execute_tool_call(tool_name: str, tool_args: dict) -> str:
             target_user_id=target_user_id,
             target_user_name=target_user_name if target_user_name else None
         )
+        notify_new_reminder()
         if trigger_type == "minutes" and minutes:
             trigger_display = (now + timedelta(minutes=minutes)).strftime("%H:%M:%S")
             type_display = f"{minutes} menit dari sekarang"
@@ -1410,7 +1643,6 @@ async def execute_tool_call(tool_name: str, tool_args: dict) -> str:
             return f"❌ Git pull failed: {result['error']}"
         elif action == "restart":
             # ── Cooldown: cegah restart loop ──
-            import time
             cooldown_file = "/tmp/clawai_last_restart"
             if os.path.exists(cooldown_file):
                 try:
@@ -1493,11 +1725,11 @@ async def read_uploaded_file(file_url: str, filename: str) -> Optional[str]:
             log.info(f"🖼️ Image detected: {filename}")
             return json.dumps({"type": "image_attachment", "url": file_url, "filename": filename})
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(file_url, timeout=aiohttp.ClientTimeout(total=30)) as resp:
-                if resp.status != 200:
-                    return None
-                data = await resp.read()
+        session = await get_session()
+        async with session.get(file_url, timeout=aiohttp.ClientTimeout(total=30)) as resp:
+            if resp.status != 200:
+                return None
+            data = await resp.read()
 
         # ── TEXT / CODE FILES ──
         text_extensions = {
@@ -1819,20 +2051,133 @@ async def handle_with_tools(messages: list, prov_name: str, model: str,
 # FALLBACK
 # ============================================================
 
-async def execute_with_fallback(messages, mode, preferred_provider, preferred_model, guild_id=0):
+# ── Circuit breaker: skip provider yang sedang down tanpa round-trip ──
+BREAKER_THRESHOLD = 5   # gagal berturut-turut...
+BREAKER_WINDOW = 60     # ...dalam 60 detik → OPEN
+BREAKER_COOLDOWN = 30   # OPEN selama 30 detik, lalu HALF-OPEN (1 percobaan)
+_BREAKER: Dict[str, dict] = {}
+
+def breaker_state(pname: str) -> str:
+    """closed / open / half_open — dipakai juga untuk telemetry (!monitor)"""
+    b = _BREAKER.get(pname)
+    return b["state"] if b else "closed"
+
+def _breaker_blocked(pname: str) -> bool:
+    """Read-only: OPEN dan cooldown belum habis (atau probe half-open sedang jalan)"""
+    b = _BREAKER.get(pname)
+    return bool(b) and b["state"] != "closed" and time.monotonic() < b["open_until"]
+
+def _breaker_allows(pname: str) -> bool:
+    """Panggil tepat sebelum request ke provider — cooldown habis → klaim satu-satunya slot half-open"""
+    b = _BREAKER.get(pname)
+    if not b or b["state"] == "closed":
+        return True
+    now = time.monotonic()
+    if now < b["open_until"]:
+        return False
+    # Cooldown habis → izinkan satu percobaan (half-open)
+    b["state"] = "half_open"
+    b["open_until"] = now + BREAKER_COOLDOWN
+    return True
+
+def _breaker_record(pname: str, ok: bool):
+    if ok:
+        _BREAKER.pop(pname, None)
+        return
+    now = time.monotonic()
+    b = _BREAKER.setdefault(pname, {"fails": 0, "first_fail": now, "open_until": 0.0, "state": "closed"})
+    if b["state"] == "half_open":
+        b["state"], b["open_until"] = "open", now + BREAKER_COOLDOWN
+        log.warning(f"🔌 Breaker re-OPEN: {pname}")
+        return
+    if now - b["first_fail"] > BREAKER_WINDOW:
+        b["fails"], b["first_fail"] = 0, now
+    b["fails"] += 1
+    if b["fails"] >= BREAKER_THRESHOLD and b["state"] == "closed":
+        b["state"], b["open_until"] = "open", now + BREAKER_COOLDOWN
+        log.warning(f"🔌 Breaker OPEN: {pname} ({b['fails']} failures)")
+
+_HEALTH_CACHE: Dict[str, tuple] = {}
+HEALTH_TTL = 30
+
+async def _cached_health(pname: str, prov) -> bool:
+    """health_check() dengan cache TTL singkat per provider (tanpa efek samping ke breaker)"""
+    if not prov or _breaker_blocked(pname):
+        return False
+    now = time.monotonic()
+    cached = _HEALTH_CACHE.get(pname)
+    if cached and now - cached[0] < HEALTH_TTL:
+        return cached[1]
+    try:
+        ok = bool(await prov.health_check())
+    except Exception:
+        ok = False
+    _HEALTH_CACHE[pname] = (now, ok)
+    return ok
+
+async def execute_with_fallback(messages, mode, preferred_provider, preferred_model, guild_id=0, hedge=None,
+                                on_partial=None):
     chain = [(preferred_provider, preferred_model)]
     for item in FALLBACK_CHAINS.get(mode, FALLBACK_CHAINS["normal"]):
         if item[0] not in ["duckduckgo", "tavily", "brave", "serper", "jina"] and item not in chain:
             chain.append(item)
-    fallback_note, orig_p, orig_m, is_fb = None, preferred_provider, preferred_model, False
-    for pname, mid in chain:
-        prov = ProviderFactory.get(pname, API_KEYS)
-        if not prov or not await prov.health_check(): continue
+    orig_p, orig_m = preferred_provider, preferred_model
+
+    # Probe semua provider di chain sekaligus, bukan satu-satu
+    providers = [ProviderFactory.get(pname, API_KEYS) for pname, _ in chain]
+    healths = await asyncio.gather(*(_cached_health(pname, p) for (pname, _), p in zip(chain, providers)))
+    candidates = [(pname, mid, prov) for (pname, mid), prov, ok in zip(chain, providers, healths) if ok]
+
+    if hedge is None:
+        hedge = HEDGE_REQUESTS and mode in HEDGE_MODES
+
+    # Breaker dicek lazy tepat sebelum provider dipanggil → slot half-open hanya diklaim
+    # provider yang benar-benar dicoba, bukan semua fallback di chain
+    claimed = set()
+    if hedge and len(candidates) >= 2:
+        pair, rest = [], []
+        for cand in candidates:
+            if len(pair) < 2 and _breaker_allows(cand[0]):
+                claimed.add(cand[0])
+                pair.append(cand)
+            else:
+                rest.append(cand)
+        if len(pair) == 2:
+            candidates = rest
+        else:
+            hedge = False
+    else:
+        hedge = False
+
+    if hedge:
+        log.info(f"Hedging {pair[0][0]}/{pair[0][1]} + {pair[1][0]}/{pair[1][1]}")
+        winner, resp, failed = await ProviderFactory.race([(p, m) for p, m, _ in pair], API_KEYS, messages)
+        for i, fresp in failed:
+            log.warning(f"Failed: {pair[i][0]}/{pair[i][1]}")
+            _breaker_record(pair[i][0], False)
+            _log_request(guild_id, pair[i][0], pair[i][1], False, fresp.latency, i > 0, fresp.error)
+        if resp is not None:
+            pname, mid, _ = pair[winner]
+            _breaker_record(pname, True)
+            _log_request(guild_id, pname, mid, True, resp.latency, winner > 0)
+            fallback_note = f"⚡ {orig_p}/{orig_m} → {pname}/{mid}" if winner > 0 else None
+            return resp, fallback_note
+        is_fb = True
+    else:
+        is_fb = False
+
+    for pname, mid, prov in candidates:
+        if pname not in claimed and not _breaker_allows(pname):
+            continue
         log.info(f"Trying {pname}/{mid}")
-        resp = await prov.chat(messages, mid)
+        if on_partial:
+            resp = await prov.chat(messages, mid, on_partial=on_partial)
+        else:
+            resp = await prov.chat(messages, mid)
+        _breaker_record(pname, resp.success)
         if resp.success:
             _log_request(guild_id, pname, mid, True, resp.latency, is_fb)
-            if is_fb: fallback_note = f"⚡ {orig_p}/{orig_m} → {pname}/{mid}"
+            fallback_note = f"⚡ {orig_p}/{orig_m} → {pname}/{mid}" if is_fb else None
             return resp, fallback_note
         log.warning(f"Failed: {pname}/{mid}")
         _log_request(guild_id, pname, mid, False, resp.latency, is_fb, resp.error)
@@ -1928,23 +2273,25 @@ RULES:
 - Jangan mengarang data, gunakan kemampuan search bawaan untuk fakta terkini.
 """
 
+    # Bagian statis di depan, admin_context (beda per user) paling akhir
+    # supaya prefix system prompt sama untuk semua user → prompt cache provider kena
     prompts = {
-        "normal": base_personality + admin_context + language_rules + tool_rules,
+        "normal": base_personality + language_rules + tool_rules + admin_context,
 
-        "reasoning": base_personality + admin_context + language_rules + """
+        "reasoning": base_personality + language_rules + """
 Berpikir bertahap. Jangan pakai <think> tags. Jelaskan secara natural.
-Jawab sesuai bahasa user.""",
+Jawab sesuai bahasa user.""" + admin_context,
 
-        "search": base_personality + admin_context + language_rules + """
+        "search": base_personality + language_rules + """
 Jawab pertanyaan user secara natural dari hasil pencarian. Ambil poin penting saja agar tidak terlalu panjang.
 Selalu rapih teksnya dan konsisten dalam satu percakapan — profesional dan elegan.
 Selalu berikan quote di akhir kalimat sesuai konteks. selalu ambil dari media populer dan media besar yang terpercaya dan kredibel dari lokal maupun internasional
 selalu gunakan skill ini jika kamu tidak tahu atau keterbatasan pengetahuan, jangan bilang tidak tahu dulu jika belum cek real-time nya
-tampilkan sumber/sitasi di setiap yang kamu rangkum bukan di bagian akhir di bagian penutup. jangan tampilkan menurut/hasil penelusuran cukup highlight sumber/sitasi saja, Jawab sesuai bahasa user.""",
+tampilkan sumber/sitasi di setiap yang kamu rangkum bukan di bagian akhir di bagian penutup. jangan tampilkan menurut/hasil penelusuran cukup highlight sumber/sitasi saja, Jawab sesuai bahasa user.""" + admin_context,
 
-        "with_skill": base_personality + admin_context + language_rules + tool_rules,
+        "with_skill": base_personality + language_rules + tool_rules + admin_context,
 
-        "grounding": base_personality + admin_context + language_rules + grounding_rules,
+        "grounding": base_personality + language_rules + grounding_rules + admin_context,
     }
 
     return prompts.get(mode, prompts["normal"])
@@ -2014,22 +2361,24 @@ async def process_with_vision(content: str, image_urls: list, settings: dict) ->
 # MAIN HANDLER
 # ============================================================
 
+# Bagian statis prompt search mode: "[user]: <content>\n\nHasil pencarian:\n<hasil>"
+_SEARCH_USER_TPL = ("]: ", "\n\nHasil pencarian:\n")
+
 async def handle_message(content: str, settings: Dict, channel_id: int = 0,
-                         user_id: int = 0, user_name: str = "User") -> Dict:
+                         user_id: int = 0, user_name: str = "User", on_partial=None) -> Dict:
+    """on_partial: optional async callback(text_so_far) for streamed (non-tool) replies"""
     mode = settings.get("active_mode", "normal")
     guild_id = settings.get("guild_id", 0)
 
     # ── Check if current model is grounding (before loading history) ──
-    profile_initial = settings.get("profiles", {}).get(mode, {})
-    _prov_initial = profile_initial.get("provider", "groq")
-    _mid_initial = profile_initial.get("model", "llama-3.3-70b-versatile")
-    _is_grounding = is_grounding_model(_prov_initial, _mid_initial)
+    plan = get_routing_plan(settings, mode)
+    _is_grounding = plan.grounding
 
     # Grounding models have smaller context limit, reduce history
     history = get_conversation(guild_id, channel_id, limit=10 if _is_grounding else 30)
 
     if _is_grounding:
-        log.info(f"🌐 Grounding model detected: {_prov_initial}/{_mid_initial} — skipping tools/skills")
+        log.info(f"🌐 Grounding model detected: {plan.provider}/{plan.model} — skipping tools/skills")
 
     # ── Dynamic system prompt with admin context ──
     system_prompt = get_system_prompt("grounding" if _is_grounding else mode, user_id, user_name)
@@ -2089,8 +2438,7 @@ async def handle_message(content: str, settings: Dict, channel_id: int = 0,
             log.warning(f"Skill detection error: {e}")
 
     if skill_result:
-        profile = settings.get("profiles", {}).get(mode, {"provider": "groq", "model": "llama-3.3-70b-versatile"})
-        prov, mid = profile.get("provider", "groq"), profile.get("model", "llama-3.3-70b-versatile")
+        prov, mid = plan.provider, plan.model
 
         msgs = [
             {"role": "system", "content": get_system_prompt("with_skill", user_id, user_name)},
@@ -2098,7 +2446,7 @@ async def handle_message(content: str, settings: Dict, channel_id: int = 0,
             {"role": "user", "content": f"[{user_name}] bertanya: {content}\n\nHasil tool:\n{skill_result}\n\nSampaikan informasi ini secara natural."}
         ]
 
-        resp, fb_note = await execute_with_fallback(msgs, mode, prov, mid, guild_id)
+        resp, fb_note = await execute_with_fallback(msgs, mode, prov, mid, guild_id, on_partial=on_partial)
         text = strip_think_tags(resp.content) if resp.success else skill_result
 
         save_message(guild_id, channel_id, user_id, user_name, "user", content)
@@ -2120,8 +2468,8 @@ async def handle_message(content: str, settings: Dict, channel_id: int = 0,
     # STEP 2B: Auto Tool Calling
     # =========================================================
 
-    profile = settings.get("profiles", {}).get(mode, {"provider": "groq", "model": "llama-3.3-70b-versatile"})
-    prov, mid = profile.get("provider", "groq"), profile.get("model", "llama-3.3-70b-versatile")
+    plan = get_routing_plan(settings, mode)
+    prov, mid = plan.provider, plan.model
 
     from core.providers import supports_tool_calling
     if supports_tool_calling(prov) and not _is_grounding:
@@ -2165,8 +2513,15 @@ async def handle_message(content: str, settings: Dict, channel_id: int = 0,
     # STEP 3: Regular AI chat (Fallback)
     # =========================================================
 
-    profile = settings.get("profiles", {}).get(mode, {"provider": "groq", "model": "llama-3.3-70b-versatile"})
-    prov, mid = profile.get("provider", "groq"), profile.get("model", "llama-3.3-70b-versatile")
+    # Cache hanya di jalur tanpa tools — tool path bisa bikin reminder/aksi, jawabannya tidak boleh di-replay
+    cache_key = None if _is_grounding else _resp_cache_key(
+        mode, prov, mid, content, guild_id, channel_id, user_id)
+    cached_text = await _resp_cache_get(cache_key, content)
+    if cached_text is not None:
+        log.info(f"⚡ Response cache hit: {prov}/{mid}")
+        save_message(guild_id, channel_id, user_id, user_name, "user", content)
+        save_message(guild_id, channel_id, user_id, user_name, "assistant", cached_text)
+        return {"text": cached_text, "fallback_note": "⚡ Cached", "actions": []}
 
     formatted_history = []
     for msg in history:
@@ -2183,11 +2538,11 @@ async def handle_message(content: str, settings: Dict, channel_id: int = 0,
             {"role": "user", "content": f"[{user_name}]: {content}"}
         ]
     elif mode == "search":
-        search_res = await do_search(content, profile.get("engine", "duckduckgo"))
+        search_res = await do_search(content, plan.engine)
         msgs = [
             {"role": "system", "content": system_prompt},
             *formatted_history,
-            {"role": "user", "content": f"[{user_name}]: {content}\n\nHasil pencarian:\n{search_res}"}
+            {"role": "user", "content": "".join(("[", user_name, _SEARCH_USER_TPL[0], content, _SEARCH_USER_TPL[1], search_res))}
         ]
     else:
         msgs = [
@@ -2196,10 +2551,11 @@ async def handle_message(content: str, settings: Dict, channel_id: int = 0,
             {"role": "user", "content": f"[{user_name}]: {content}"}
         ]
 
-    resp, fb_note = await execute_with_fallback(msgs, mode, prov, mid, guild_id)
+    resp, fb_note = await execute_with_fallback(msgs, mode, prov, mid, guild_id, on_partial=on_partial)
 
     if resp.success:
         text = strip_think_tags(resp.content) or "Tidak ada jawaban."
+        await _resp_cache_put(cache_key, content, text)
         save_message(guild_id, channel_id, user_id, user_name, "user", content)
         save_message(guild_id, channel_id, user_id, user_name, "assistant", text)
         return {"text": text, "fallback_note": fb_note, "actions": []}
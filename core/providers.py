@@ -17,29 +17,178 @@ CHANGELOG (Feb 27):
 import os
 import json
 import hashlib
+import secrets
 import time
 import aiohttp
 import asyncio
+import functools
 import logging
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any, List
-from dataclasses import dataclass
+from urllib.parse import urlsplit
+from typing import Optional, Dict, Any, List, Tuple, Callable, AsyncIterator
+from collections import OrderedDict, deque
+from dataclasses import dataclass, replace
+from core.semantic_cache import SemanticCache
 
 log = logging.getLogger(__name__)
 
+# orjson (C) untuk encode payload / decode response — fallback ke stdlib json
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+    def _dumps_str(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    orjson = None
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+    _loads = json.loads
+    _dumps_str = json.dumps
+
+# httpx + h2 → HTTP/2 multiplexing (satu koneksi TLS untuk banyak chat paralel).
+# Default OFF — semua request lewat pool aiohttp per host. Aktifkan dengan PROVIDER_HTTP2=true
+# (butuh httpx[http2]); kalau h2 tidak terpasang tetap jatuh ke aiohttp
+httpx = None
+HTTP2_ENABLED = False
+if os.getenv("PROVIDER_HTTP2", "false").lower() in ("1", "true", "yes"):
+    try:
+        import httpx
+        import h2  # noqa: F401
+        HTTP2_ENABLED = True
+    except ImportError:
+        httpx = None
+        log.warning("PROVIDER_HTTP2 aktif tapi httpx[http2] tidak terpasang — pakai aiohttp")
+
 # ============================================================
 # TOOL CAPABLE PROVIDERS — Updated with new providers
 # ============================================================
-TOOL_CAPABLE_PROVIDERS = {
+TOOL_CAPABLE_PROVIDERS = frozenset({
     "local", "groq", "openrouter", "cerebras", "sambanova", "pollinations",
     "routeway", "mistral", "nvidia", "openai", "anthropic", "xai",
     "gemini", "cohere", "siliconflow", "cloudflare",
-}
+})
 
 def supports_tool_calling(provider_name: str) -> bool:
     return provider_name in TOOL_CAPABLE_PROVIDERS
 
 
+# ============================================================
+# SHARED HTTP SESSION — keep-alive pool untuk semua provider
+# ============================================================
+
+# Satu session (connector) per host provider → pool keep-alive terpisah, tidak saling rebutan.
+# Key "" = session umum untuk helper non-provider (search, fetch, weather, ...)
+_SESSIONS: Dict[str, aiohttp.ClientSession] = {}
+
+# Override limit_per_host untuk provider yang rate limit-nya longgar
+_HOST_LIMITS = {"openrouter.ai": 64, "api.groq.com": 32, "gen.pollinations.ai": 32}
+
+def _make_resolver():
+    """aiodns-backed resolver kalau ada, supaya DNS tidak lewat thread pool"""
+    try:
+        import aiodns  # noqa: F401
+        return aiohttp.AsyncResolver()
+    except ImportError:
+        return None
+
+_PROBE_TIMEOUT = aiohttp.ClientTimeout(total=5)
+# connect=10 (termasuk antre slot pool), sock_connect=3 (TCP+TLS ke host): host mati cepat gagal
+# → fallback chain jalan, bukan nunggu total habis. sock_read sengaja tidak dibatasi:
+# response non-streaming baru mulai dikirim setelah generate selesai
+_DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=60, connect=10, sock_connect=3)
+
+async def get_session(endpoint: Optional[str] = None,
+                      limit_per_host: Optional[int] = None) -> aiohttp.ClientSession:
+    """Lazily create one ClientSession per endpoint host so TCP/TLS connections are reused.
+    limit_per_host (dari Provider.POOL_SIZE) override _HOST_LIMITS saat session dibuat"""
+    host = urlsplit(endpoint).netloc if endpoint else ""
+    session = _SESSIONS.get(host)
+    if session is None or session.closed:
+        session = _SESSIONS[host] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=200, limit_per_host=limit_per_host or _HOST_LIMITS.get(host, 32),
+                ttl_dns_cache=300, keepalive_timeout=75,
+                happy_eyeballs_delay=0.1,            # cepat fallback IPv6 → IPv4
+                resolver=_make_resolver(),
+            ),
+            timeout=_DEFAULT_TIMEOUT,
+            json_serialize=_dumps_str,               # json= dari helper (search, tts, ...) lewat orjson
+        )
+    return session
+
+_H2_CLIENTS: Dict[str, "httpx.AsyncClient"] = {}
+
+def _h2_timeout(timeout: aiohttp.ClientTimeout) -> "httpx.Timeout":
+    """aiohttp ClientTimeout → httpx.Timeout: sock_connect = TCP+TLS, connect = antre slot pool"""
+    return httpx.Timeout(timeout.total, connect=timeout.sock_connect or timeout.connect or timeout.total,
+                         pool=timeout.connect or timeout.total)
+
+def get_h2_client(endpoint: str, max_connections: Optional[int] = None) -> "httpx.AsyncClient":
+    """One HTTP/2 httpx client per endpoint host (sama seperti get_session).
+    max_connections (dari Provider.POOL_SIZE) override _HOST_LIMITS saat client dibuat"""
+    host = urlsplit(endpoint).netloc
+    client = _H2_CLIENTS.get(host)
+    if client is None or client.is_closed:
+        limit = max_connections or _HOST_LIMITS.get(host, 32)
+        client = _H2_CLIENTS[host] = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit,
+                                keepalive_expiry=75),
+            timeout=_h2_timeout(_DEFAULT_TIMEOUT),
+        )
+    return client
+
+async def _h2_err_text(resp, limit: int = 512) -> str:
+    """Versi httpx dari _safe_err_text: berhenti baca setelah limit byte"""
+    buf = b""
+    async for chunk in resp.aiter_bytes():
+        buf += chunk
+        if len(buf) >= limit:
+            break
+    return buf[:limit].decode("utf-8", "replace")
+
+async def _iter_sse(resp) -> AsyncIterator[Dict]:
+    """Yield decoded SSE data frames line by line (sampai [DONE] / stream ditutup)"""
+    async for raw in resp.content:
+        line = raw.decode("utf-8", "ignore").strip()
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        try:
+            chunk = _loads(data)
+        except ValueError:
+            continue
+        yield chunk
+
+async def _safe_err_text(resp, limit: int = 512) -> str:
+    """Baca prefix body error saja — proxy yang salah route bisa balikin HTML ber-MB"""
+    return (await resp.content.read(limit)).decode("utf-8", "replace")
+
+async def _read_json(resp) -> Any:
+    """Decode JSON body. Kalau Content-Length diketahui (dan tidak di-compress),
+    baca sekali pakai readexactly → skip list-of-chunks + join di resp.read()"""
+    n = resp.content_length
+    if n and "Content-Encoding" not in resp.headers:
+        return _loads(await resp.content.readexactly(n))
+    return _loads(await resp.read())
+
+async def close_session():
+    """Close all shared sessions — call on bot shutdown"""
+    sessions = list(_SESSIONS.values())
+    _SESSIONS.clear()
+    for session in sessions:
+        if not session.closed:
+            await session.close()
+    clients = list(_H2_CLIENTS.values())
+    _H2_CLIENTS.clear()
+    for client in clients:
+        if not client.is_closed:
+            await client.aclose()
+
+
 # ============================================================
 # BASE PROVIDER
 # ============================================================
@@ -55,15 +204,217 @@ class AIResponse:
     tokens_used: int = 0
     latency: float = 0.0
     tool_calls: Any = None
-    raw: Any = None
+    raw: Any = None  # full JSON body, hanya diisi kalau chat(..., _debug=True)
+
+# ============================================================
+# LLM RESPONSE CACHE (L1) — dedup request low-temperature
+# + coalescing request identik yang sedang in-flight
+# ============================================================
+
+class LLMCache:
+    """LRU + TTL cache of AIResponse keyed by blake2b of the request payload"""
+
+    # translate_text memakai 0.3 (satu-satunya call site low-temperature); chat biasa pakai
+    # default 0.7 → sengaja tidak di-cache di sini (lihat _RESP_CACHE di handler)
+    MAX_TEMPERATURE = 0.3
+    WARM_TTL = 600          # TTL untuk 0 < temperature <= MAX_TEMPERATURE
+
+    def __init__(self, max_size: int = 2048, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, AIResponse)
+
+    # Tidak mempengaruhi isi response → tidak ikut key
+    _KEY_SKIP = frozenset({"on_partial", "_debug"})
+
+    @classmethod
+    def key(cls, provider: str, model: str, messages: List[Dict], kwargs: Dict) -> str:
+        # Semua kwarg ikut (tool_choice, search, grounding, ...) — bukan subset pilihan,
+        # supaya dua call yang beda flag tidak pernah di-merge / di-cache jadi satu
+        obj = {
+            "provider": provider, "model": model, "messages": messages,
+            "kwargs": {k: v for k, v in kwargs.items() if k not in cls._KEY_SKIP},
+        }
+        if orjson is not None:
+            blob = orjson.dumps(obj, default=str, option=orjson.OPT_SORT_KEYS)
+        else:
+            blob = json.dumps(obj, sort_keys=True, default=str).encode()
+        return hashlib.blake2b(blob, digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Optional["AIResponse"]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return replace(entry[1])  # copy, caller boleh mutate
+
+    def put(self, key: str, resp: "AIResponse", ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (ttl or self.ttl), replace(resp, raw=None))
+        self._data.move_to_end(key)
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+
+llm_cache = LLMCache()
+
+# L2: semantic match pada pesan user terakhir, konteks sebelumnya (system + history) harus identik.
+# Default OFF — aktifkan dengan PROVIDER_SEMANTIC_CACHE=true (butuh fastembed + numpy)
+SEMANTIC_L2 = os.getenv("PROVIDER_SEMANTIC_CACHE", "false").lower() in ("1", "true", "yes")
+llm_semantic_cache = SemanticCache(threshold=0.95, max_entries=4096, opt_in=SEMANTIC_L2)
+
+def _semantic_route(provider: str, model: str, messages: List[Dict]) -> Optional[tuple]:
+    if not messages or messages[-1].get("role") != "user" or not isinstance(messages[-1].get("content"), str):
+        return None
+    prefix = _dumps(messages[:-1])
+    return provider, model, hashlib.blake2b(prefix, digest_size=16).hexdigest()
+
+# ============================================================
+# AIMD CONCURRENCY GATE — per provider instance
+# ============================================================
+
+class _AIMDGate:
+    """Batasi request paralel ke satu provider; limit turun setengah saat 429/503,
+    naik +1 setelah satu 'window' (limit request) sukses berturut-turut"""
+
+    def __init__(self, ceiling: int):
+        self.ceiling = ceiling
+        self.limit = float(ceiling)
+        self._active = 0
+        self._streak = 0
+        self._waiters: deque = deque()
+
+    async def acquire(self):
+        while self._active >= int(self.limit):
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    self._wake()  # sudah dibangunkan tapi batal → oper slot ke waiter berikutnya
+                raise
+        self._active += 1
+
+    def release(self, ok: Optional[bool]):
+        """ok=True sukses, False throttled (429/503), None error lain (tidak mengubah limit)"""
+        self._active -= 1
+        if ok is False:
+            self.limit = max(1.0, self.limit / 2)
+            self._streak = 0
+        elif ok:
+            self._streak += 1
+            if self._streak >= int(self.limit):
+                self.limit = min(float(self.ceiling), self.limit + 1)
+                self._streak = 0
+        self._wake()
+
+    def _wake(self):
+        free = int(self.limit) - self._active
+        while free > 0 and self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                free -= 1
+
+
+def _gate_outcome(resp: AIResponse) -> Optional[bool]:
+    if resp.success:
+        return True
+    err = resp.error or ""
+    if err.startswith(("HTTP 429", "HTTP 503")) or "(429)" in err:
+        return False
+    return None
+
+async def _gated(self, chat, messages, model, kwargs) -> AIResponse:
+    gate = self._gate
+    await gate.acquire()
+    ok = None
+    try:
+        resp = await chat(self, messages, model, **kwargs)
+        ok = _gate_outcome(resp)
+        return resp
+    finally:
+        gate.release(ok)
+
+# Request identik yang sedang jalan (mis. beberapa user kirim prompt sama bersamaan)
+# → satu HTTP call, hasilnya dibagi ke semua pemanggil
+_INFLIGHT: Dict[str, asyncio.Future] = {}
+
+def _maybe_cached(chat):
+    """Wrap provider.chat(): coalesce identical in-flight calls; cache low-temperature, tool-free ones"""
+    @functools.wraps(chat)
+    async def wrapper(self, messages, model, **kwargs):
+        if kwargs.get("on_partial") or kwargs.get("_debug"):
+            return await _gated(self, chat, messages, model, kwargs)
+        key = LLMCache.key(self.name, model, messages, kwargs)
+        temperature = kwargs.get("temperature")
+        cacheable = (temperature is not None and temperature <= LLMCache.MAX_TEMPERATURE
+                     and not kwargs.get("tools"))
+        route = None
+        if cacheable:
+            hit = llm_cache.get(key)
+            if hit is not None:
+                return hit
+            if SEMANTIC_L2 and llm_semantic_cache.enabled:
+                route = _semantic_route(self.name, model, messages)
+                text = route and await llm_semantic_cache.get(route, messages[-1]["content"])
+                if text:
+                    return AIResponse(success=True, content=text, provider=self.name, model=model)
+
+        fut = _INFLIGHT.get(key)
+        if fut is not None:
+            try:
+                return replace(await asyncio.shield(fut))
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    raise  # pemanggil ini sendiri yang di-cancel
+                # leader di-cancel (mis. kalah hedging) → request sendiri
+
+        fut = asyncio.get_running_loop().create_future()
+        _INFLIGHT[key] = fut
+        try:
+            resp = await _gated(self, chat, messages, model, kwargs)
+        except BaseException:
+            fut.cancel()
+            raise
+        finally:
+            if _INFLIGHT.get(key) is fut:
+                del _INFLIGHT[key]
+        fut.set_result(resp)
+        if resp.success:
+            self._last_success_ts = time.perf_counter()
+        if cacheable and resp.success and not resp.tool_calls:
+            llm_cache.put(key, resp, None if temperature == 0 else LLMCache.WARM_TTL)
+            if route:
+                await llm_semantic_cache.put(route, messages[-1]["content"], resp.content)
+        return resp
+    return wrapper
+
 
 class BaseProvider(ABC):
     """Abstract base class for all AI providers"""
 
+    TIMEOUT = _DEFAULT_TIMEOUT  # dibuat sekali, override per provider kalau perlu
+    POOL_SIZE: Optional[int] = None  # limit_per_host; None → _HOST_LIMITS / default 32
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "chat" in cls.__dict__:
+            cls.chat = _maybe_cached(cls.__dict__["chat"])
+
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key
         self.name = "base"
         self.endpoint = ""
+        self._headers: Optional[Dict[str, str]] = None
+        self._last_success_ts = float("-inf")
+        self._gate = _AIMDGate(self.POOL_SIZE or 32)
 
     @abstractmethod
     async def chat(
@@ -74,14 +425,64 @@ class BaseProvider(ABC):
     ) -> AIResponse:
         pass
 
+    HEALTHY_WINDOW = 30.0  # detik — sukses baru-baru ini dianggap sehat tanpa probe
+
     async def health_check(self) -> bool:
+        if time.perf_counter() - self._last_success_ts < self.HEALTHY_WINDOW:
+            return True
+        return await self._probe()
+
+    async def _probe(self) -> bool:
         return self.api_key is not None or self.name in ["pollinations", "mlvoca", "puter", "local"]
 
+    @staticmethod
+    def _normalize_for_cache(messages: List[Dict]) -> List[Dict]:
+        """Static prefix dulu: semua system message digabung jadi satu di paling atas
+        supaya prefix cache provider (Anthropic/OpenAI) tetap kena"""
+        system = [m["content"] for m in messages if m["role"] == "system"]
+        if not system or (len(system) == 1 and messages[0]["role"] == "system"):
+            return messages
+        return [{"role": "system", "content": "\n\n".join(system)},
+                *(m for m in messages if m["role"] != "system")]
+
+    def _fail(self, model: str, error: str) -> AIResponse:
+        """Error response untuk cabang timeout/exception"""
+        return AIResponse(success=False, content="", provider=self.name, model=model, error=error)
+
+    async def _session(self) -> aiohttp.ClientSession:
+        return await get_session(self.endpoint or getattr(self, "base_url", ""), self.POOL_SIZE)
+
+    WARM_CONNECTIONS = 2  # socket keep-alive yang dibuka paralel saat warmup
+
+    async def warmup(self):
+        """HEAD murah ke host provider: DNS masuk cache + beberapa socket keep-alive parkir di pool,
+        jadi chat pertama (dan burst pertama) tidak bayar DNS+TLS"""
+        url = self.endpoint or getattr(self, "base_url", "")
+        if not url:
+            return
+        try:
+            session = await self._session()
+        except Exception:
+            return
+
+        async def _head():
+            try:
+                async with session.head(url, timeout=_PROBE_TIMEOUT):
+                    pass
+            except Exception:
+                pass
+
+        n = min(self.WARM_CONNECTIONS, self.POOL_SIZE or self.WARM_CONNECTIONS)
+        await asyncio.gather(*(_head() for _ in range(n)))
+
     def _build_headers(self) -> Dict[str, str]:
-        headers = {"Content-Type": "application/json"}
-        if self.api_key:
-            headers["Authorization"] = f"Bearer {self.api_key}"
-        return headers
+        # api_key tidak berubah setelah init → cukup dibangun sekali (jangan di-mutate)
+        if self._headers is None:
+            headers = {"Content-Type": "application/json"}
+            if self.api_key:
+                headers["Authorization"] = f"Bearer {self.api_key}"
+            self._headers = headers
+        return self._headers
 
 
 # ============================================================
@@ -89,7 +490,164 @@ class BaseProvider(ABC):
 # ============================================================
 
 class OpenAICompatibleProvider(BaseProvider):
-    """Base class for OpenAI-compatible APIs"""
+    """Base class for OpenAI-compatible APIs
+
+    Streaming: pass on_partial=<async callback(text_so_far)> to chat() and the
+    request is sent with stream=true; the callback fires per SSE delta and the
+    final AIResponse still carries the full content. Ignored when tools are used.
+    chat_stream() yields the raw deltas instead, for callers that want a generator.
+
+    Non-streaming requests go over HTTP/2 (httpx) only when PROVIDER_HTTP2=true; set
+    HTTP2 = False on subclasses whose endpoint misbehaves with it → tetap lewat aiohttp.
+    """
+
+    HTTP2 = True
+
+    def _completion(self, data: Dict, model: str, latency: float, debug: bool = False) -> AIResponse:
+        msg = data["choices"][0].get("message", {})
+        return AIResponse(
+            success=True, content=msg.get("content") or "",
+            provider=self.name, model=model,
+            tokens_used=data.get("usage", {}).get("total_tokens", 0), latency=latency,
+            tool_calls=msg.get("tool_calls"), raw=data if debug else None
+        )
+
+    # --- Hooks untuk subclass (OpenRouter dll) ---
+
+    def _prepare_messages(self, messages: List[Dict], model: str) -> List[Dict]:
+        return messages
+
+    def _allow_tools(self, model: str) -> bool:
+        return True
+
+    async def _on_error(self, status: int, payload: Dict, start: float,
+                        kwargs: Dict) -> Optional[AIResponse]:
+        """Retry / error khusus per status. None → pakai error response default"""
+        return None
+
+    def _error(self, status: int, error_text: str, model: str, latency: float) -> AIResponse:
+        log.warning(f"{self.name} error {status}: {error_text[:200]}")
+        return AIResponse(
+            success=False, content="",
+            provider=self.name, model=model,
+            error=f"HTTP {status}: {error_text[:100]}",
+            latency=latency
+        )
+
+    def _uses_h2(self) -> bool:
+        return HTTP2_ENABLED and self.HTTP2
+
+    def _h2_client(self) -> "httpx.AsyncClient":
+        return get_h2_client(self.endpoint, self.POOL_SIZE)
+
+    async def warmup(self):
+        """Streaming tetap lewat pool aiohttp; non-streaming lewat client HTTP/2 → hangatkan keduanya.
+        HTTP/2 multiplex di satu koneksi, jadi satu HEAD cukup"""
+        await super().warmup()
+        if not self._uses_h2() or not self.endpoint:
+            return
+        try:
+            await self._h2_client().head(self.endpoint, timeout=_h2_timeout(_PROBE_TIMEOUT))
+        except Exception:
+            pass
+
+    async def _chat_h2(self, payload: Dict, model: str, start: float, kwargs: Dict) -> AIResponse:
+        async with self._h2_client().stream(
+            "POST", self.endpoint,
+            content=_dumps(payload),
+            headers=self._build_headers(),
+            timeout=_h2_timeout(self.TIMEOUT),
+        ) as resp:
+            latency = time.perf_counter() - start
+            if resp.status_code == 200:
+                return self._completion(_loads(await resp.aread()), model, latency,
+                                        kwargs.get("_debug", False))
+            error_text = await _h2_err_text(resp)
+        handled = await self._on_error(resp.status_code, payload, start, kwargs)
+        if handled is not None:
+            return handled
+        return self._error(resp.status_code, error_text, model, latency)
+
+    async def _post(self, payload: Dict, model: str, start: float, kwargs: Dict) -> AIResponse:
+        """Transport + parse satu request; dipakai chat() dan retry di _on_error"""
+        stream = payload.get("stream", False)
+        if self._uses_h2() and not stream:
+            return await self._chat_h2(payload, model, start, kwargs)
+
+        session = await self._session()
+        async with session.post(
+            self.endpoint,
+            headers=self._build_headers(),
+            data=_dumps(payload),
+            timeout=self.TIMEOUT
+        ) as resp:
+            latency = time.perf_counter() - start
+
+            if resp.status == 200 and stream and resp.content_type == "text/event-stream":
+                content, tokens = await self._read_sse(resp, kwargs["on_partial"])
+                return AIResponse(
+                    success=True, content=content,
+                    provider=self.name, model=model,
+                    tokens_used=tokens, latency=time.perf_counter() - start
+                )
+
+            if resp.status == 200:
+                return self._completion(await _read_json(resp), model, latency,
+                                        kwargs.get("_debug", False))
+
+            handled = await self._on_error(resp.status, payload, start, kwargs)
+            if handled is not None:
+                return handled
+            return self._error(resp.status, await _safe_err_text(resp), model, latency)
+
+    async def _read_sse(self, resp, on_partial) -> tuple:
+        """Parse OpenAI-style SSE frames. Returns (content, total_tokens)"""
+        content = ""
+        tokens = 0
+        async for chunk in _iter_sse(resp):
+            choices = chunk.get("choices") or []
+            if choices:
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    content += delta
+                    await on_partial(content)
+            usage = chunk.get("usage")
+            if usage:
+                tokens = usage.get("total_tokens", tokens)
+        return content, tokens
+
+    async def chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Async generator of content deltas (stream=true). Raises RuntimeError on non-200."""
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+        }
+        session = await self._session()
+        async with session.post(
+            self.endpoint,
+            headers=self._build_headers(),
+            data=_dumps(payload),
+            timeout=self.TIMEOUT
+        ) as resp:
+            if resp.status != 200:
+                error_text = await _safe_err_text(resp)
+                raise RuntimeError(f"{self.name} HTTP {resp.status}: {error_text[:100]}")
+            async for chunk in _iter_sse(resp):
+                choices = chunk.get("choices") or []
+                if choices:
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        yield delta
 
     async def chat(
         self,
@@ -99,64 +657,32 @@ class OpenAICompatibleProvider(BaseProvider):
         max_tokens: int = 4096,
         **kwargs
     ) -> AIResponse:
-        import time
-        start = time.time()
+        start = time.perf_counter()
 
         payload = {
             "model": model,
-            "messages": messages,
+            "messages": self._prepare_messages(messages, model),
             "temperature": temperature,
             "max_tokens": max_tokens,
         }
 
-        if kwargs.get("tools"):
+        if kwargs.get("tools") and self._allow_tools(model):
             payload["tools"] = kwargs["tools"]
             payload["tool_choice"] = kwargs.get("tool_choice", "auto")
 
+        if kwargs.get("on_partial") is not None and "tools" not in payload:
+            payload["stream"] = True
+
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.endpoint,
-                    headers=self._build_headers(),
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=60)
-                ) as resp:
-                    latency = time.time() - start
-
-                    if resp.status == 200:
-                        data = await resp.json()
-                        msg = data["choices"][0].get("message", {})
-                        content = msg.get("content") or ""
-                        tool_calls = msg.get("tool_calls")
-                        tokens = data.get("usage", {}).get("total_tokens", 0)
-
-                        return AIResponse(
-                            success=True, content=content,
-                            provider=self.name, model=model,
-                            tokens_used=tokens, latency=latency,
-                            tool_calls=tool_calls, raw=data
-                        )
-                    else:
-                        error_text = await resp.text()
-                        log.warning(f"{self.name} error {resp.status}: {error_text[:200]}")
-                        return AIResponse(
-                            success=False, content="",
-                            provider=self.name, model=model,
-                            error=f"HTTP {resp.status}: {error_text[:100]}",
-                            latency=latency
-                        )
+            return await self._post(payload, model, start, kwargs)
 
         except asyncio.TimeoutError:
-            return AIResponse(
-                success=False, content="", provider=self.name,
-                model=model, error="Request timeout"
-            )
+            return self._fail(model, "Request timeout")
         except Exception as e:
+            if httpx is not None and isinstance(e, httpx.TimeoutException):
+                return self._fail(model, "Request timeout")
             log.error(f"{self.name} exception: {e}")
-            return AIResponse(
-                success=False, content="", provider=self.name,
-                model=model, error=str(e)
-            )
+            return self._fail(model, str(e))
 
 
 # ============================================================
@@ -176,16 +702,17 @@ class LocalOllamaProvider(BaseProvider):
     - Health check via TCP socket to Ollama port
     """
 
+    TIMEOUT = aiohttp.ClientTimeout(total=120, sock_connect=3)  # CPU inference can be slow
+    POOL_SIZE = 2  # CPU box: lebih dari ini cuma antre di Ollama
+
     def __init__(self, base_url: str = "http://127.0.0.1:11434", ctx_size: int = 4096):
         super().__init__(api_key=None)
         self.name = "local"
         self.base_url = base_url.rstrip("/")
         self.endpoint = f"{self.base_url}/v1/chat/completions"
         self.ctx_size = ctx_size
-
-    def _build_headers(self) -> Dict[str, str]:
         # Ollama doesn't need auth, but some setups expect a header
-        return {
+        self._headers = {
             "Content-Type": "application/json",
         }
 
@@ -197,7 +724,7 @@ class LocalOllamaProvider(BaseProvider):
         max_tokens: int = 4096,
         **kwargs
     ) -> AIResponse:
-        start = time.time()
+        start = time.perf_counter()
 
         payload = {
             "model": model,
@@ -216,76 +743,66 @@ class LocalOllamaProvider(BaseProvider):
             payload["tool_choice"] = kwargs.get("tool_choice", "auto")
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.endpoint,
-                    headers=self._build_headers(),
-                    json=payload,
-                    # CPU inference can be slow — 120s timeout
-                    timeout=aiohttp.ClientTimeout(total=120)
-                ) as resp:
-                    latency = time.time() - start
-
-                    if resp.status == 200:
-                        data = await resp.json()
-                        msg = data["choices"][0].get("message", {})
-
-                        # Main content
-                        content = msg.get("content") or ""
-
-                        # Ollama returns thinking/reasoning in separate field
-                        reasoning = msg.get("reasoning") or ""
-
-                        # If content is empty but reasoning exists, use reasoning
-                        if not content.strip() and reasoning.strip():
-                            content = reasoning
-
-                        tool_calls = msg.get("tool_calls")
-                        tokens = data.get("usage", {}).get("total_tokens", 0)
-
-                        return AIResponse(
-                            success=True, content=content,
-                            provider=self.name, model=model,
-                            tokens_used=tokens, latency=latency,
-                            tool_calls=tool_calls, raw=data
-                        )
-                    else:
-                        error_text = await resp.text()
-                        log.warning(f"Local Ollama error {resp.status}: {error_text[:200]}")
-                        return AIResponse(
-                            success=False, content="",
-                            provider=self.name, model=model,
-                            error=f"HTTP {resp.status}: {error_text[:100]}",
-                            latency=latency
-                        )
+            session = await self._session()
+            async with session.post(
+                self.endpoint,
+                headers=self._build_headers(),
+                data=_dumps(payload),
+                timeout=self.TIMEOUT
+            ) as resp:
+                latency = time.perf_counter() - start
+
+                if resp.status == 200:
+                    data = await _read_json(resp)
+                    msg = data["choices"][0].get("message", {})
+
+                    # Main content
+                    content = msg.get("content") or ""
+
+                    # Ollama returns thinking/reasoning in separate field
+                    reasoning = msg.get("reasoning") or ""
+
+                    # If content is empty but reasoning exists, use reasoning
+                    if not content.strip() and reasoning.strip():
+                        content = reasoning
+
+                    tool_calls = msg.get("tool_calls")
+                    tokens = data.get("usage", {}).get("total_tokens", 0)
+
+                    return AIResponse(
+                        success=True, content=content,
+                        provider=self.name, model=model,
+                        tokens_used=tokens, latency=latency,
+                        tool_calls=tool_calls, raw=data if kwargs.get("_debug") else None
+                    )
+                else:
+                    error_text = await _safe_err_text(resp)
+                    log.warning(f"Local Ollama error {resp.status}: {error_text[:200]}")
+                    return AIResponse(
+                        success=False, content="",
+                        provider=self.name, model=model,
+                        error=f"HTTP {resp.status}: {error_text[:100]}",
+                        latency=latency
+                    )
 
         except asyncio.TimeoutError:
-            return AIResponse(
-                success=False, content="", provider=self.name,
-                model=model, error="Local model timeout (>120s). CPU inference may be overloaded."
-            )
+            return self._fail(model, "Local model timeout (>120s). CPU inference may be overloaded.")
         except aiohttp.ClientConnectorError:
-            return AIResponse(
-                success=False, content="", provider=self.name,
-                model=model, error=f"Cannot connect to Ollama at {self.base_url}. Is it running?"
-            )
+            return self._fail(model, f"Cannot connect to Ollama at {self.base_url}. Is it running?")
         except Exception as e:
             log.error(f"Local Ollama exception: {e}")
-            return AIResponse(
-                success=False, content="", provider=self.name,
-                model=model, error=str(e)
-            )
+            return self._fail(model, str(e))
 
-    async def health_check(self) -> bool:
+    async def _probe(self) -> bool:
         """Check if Ollama server is reachable and responsive."""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    self.base_url,
-                    timeout=aiohttp.ClientTimeout(total=5)
-                ) as resp:
-                    # Ollama returns "Ollama is running" on GET /
-                    return resp.status == 200
+            session = await self._session()
+            async with session.get(
+                self.base_url,
+                timeout=_PROBE_TIMEOUT
+            ) as resp:
+                # Ollama returns "Ollama is running" on GET /
+                return resp.status == 200
         except Exception:
             return False
 
@@ -336,6 +853,8 @@ class NvidiaProvider(OpenAICompatibleProvider):
 class OpenAIProvider(OpenAICompatibleProvider):
     """OpenAI API - GPT-5, o3, o4-mini (Paid only)"""
 
+    POOL_SIZE = 10
+
     def __init__(self, api_key: str):
         super().__init__(api_key)
         self.name = "openai"
@@ -362,18 +881,36 @@ class XAIProvider(OpenAICompatibleProvider):
 class AnthropicProvider(BaseProvider):
     """Anthropic Claude API - Uses /v1/messages (NOT OpenAI-compatible)"""
 
+    TIMEOUT = aiohttp.ClientTimeout(total=90, connect=10, sock_connect=3)
+    POOL_SIZE = 5
+
     def __init__(self, api_key: str):
         super().__init__(api_key)
         self.name = "anthropic"
         self.endpoint = "https://api.anthropic.com/v1/messages"
-
-    def _build_headers(self) -> Dict[str, str]:
-        return {
+        self._headers = {
             "Content-Type": "application/json",
             "x-api-key": self.api_key,
             "anthropic-version": "2023-06-01",
         }
 
+    async def _read_sse(self, resp, on_partial) -> tuple:
+        """Parse Anthropic SSE events (content_block_delta / usage). Returns (content, total_tokens)"""
+        content = ""
+        tokens = 0
+        async for event in _iter_sse(resp):
+            etype = event.get("type")
+            if etype == "content_block_delta":
+                text = (event.get("delta") or {}).get("text")
+                if text:
+                    content += text
+                    await on_partial(content)
+            elif etype == "message_start":
+                tokens += ((event.get("message") or {}).get("usage") or {}).get("input_tokens", 0)
+            elif etype == "message_delta":
+                tokens += (event.get("usage") or {}).get("output_tokens", 0)
+        return content, tokens
+
     async def chat(
         self,
         messages: List[Dict[str, str]],
@@ -382,22 +919,15 @@ class AnthropicProvider(BaseProvider):
         max_tokens: int = 4096,
         **kwargs
     ) -> AIResponse:
-        import time
-        start = time.time()
+        start = time.perf_counter()
 
         # Anthropic format: system terpisah dari messages
-        system_text = None
-        anthropic_messages = []
-
-        for msg in messages:
-            if msg["role"] == "system":
-                system_text = msg["content"]
-            else:
-                role = msg["role"]  # "user" or "assistant"
-                anthropic_messages.append({
-                    "role": role,
-                    "content": msg["content"]
-                })
+        messages = self._normalize_for_cache(messages)
+        system_text = messages[0]["content"] if messages and messages[0]["role"] == "system" else None
+        anthropic_messages = [
+            {"role": msg["role"], "content": msg["content"]}  # "user" or "assistant"
+            for msg in messages if msg["role"] != "system"
+        ]
 
         # Pastikan messages tidak kosong dan dimulai dengan "user"
         if not anthropic_messages:
@@ -411,7 +941,8 @@ class AnthropicProvider(BaseProvider):
         }
 
         if system_text:
-            payload["system"] = system_text
+            # Breakpoint prompt cache: tools + system di-cache, hanya history yang dihitung penuh
+            payload["system"] = [{"type": "text", "text": system_text, "cache_control": {"type": "ephemeral"}}]
 
         # Tool calling support
         if kwargs.get("tools"):
@@ -428,72 +959,79 @@ class AnthropicProvider(BaseProvider):
             if anthropic_tools:
                 payload["tools"] = anthropic_tools
 
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.endpoint,
-                    headers=self._build_headers(),
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=90)
-                ) as resp:
-                    latency = time.time() - start
-
-                    if resp.status == 200:
-                        data = await resp.json()
-
-                        # Parse Anthropic response format
-                        content_parts = data.get("content", [])
-                        text_content = ""
-                        tool_calls = []
+        on_partial = kwargs.get("on_partial")
+        stream = on_partial is not None and "tools" not in payload
+        if stream:
+            payload["stream"] = True
 
-                        for part in content_parts:
-                            if part["type"] == "text":
-                                text_content += part["text"]
-                            elif part["type"] == "tool_use":
-                                # Convert to OpenAI tool_call format for compatibility
-                                tool_calls.append({
-                                    "id": part["id"],
-                                    "type": "function",
-                                    "function": {
-                                        "name": part["name"],
-                                        "arguments": json.dumps(part["input"]),
-                                    }
-                                })
-
-                        tokens_in = data.get("usage", {}).get("input_tokens", 0)
-                        tokens_out = data.get("usage", {}).get("output_tokens", 0)
-
-                        return AIResponse(
-                            success=True,
-                            content=text_content,
-                            provider=self.name,
-                            model=model,
-                            tokens_used=tokens_in + tokens_out,
-                            latency=latency,
-                            tool_calls=tool_calls if tool_calls else None,
-                            raw=data,
-                        )
-                    else:
-                        error_text = await resp.text()
-                        log.warning(f"Anthropic error {resp.status}: {error_text[:200]}")
-                        return AIResponse(
-                            success=False, content="",
-                            provider=self.name, model=model,
-                            error=f"HTTP {resp.status}: {error_text[:100]}",
-                            latency=latency,
-                        )
+        try:
+            session = await self._session()
+            async with session.post(
+                self.endpoint,
+                headers=self._build_headers(),
+                data=_dumps(payload),
+                timeout=self.TIMEOUT
+            ) as resp:
+                latency = time.perf_counter() - start
+
+                if resp.status == 200 and stream and resp.content_type == "text/event-stream":
+                    content, tokens = await self._read_sse(resp, on_partial)
+                    return AIResponse(
+                        success=True, content=content,
+                        provider=self.name, model=model,
+                        tokens_used=tokens, latency=time.perf_counter() - start
+                    )
+
+                if resp.status == 200:
+                    data = await _read_json(resp)
+
+                    # Parse Anthropic response format
+                    content_parts = data.get("content", [])
+                    texts = []
+                    tool_calls = []
+
+                    for part in content_parts:
+                        if part["type"] == "text":
+                            texts.append(part["text"])
+                        elif part["type"] == "tool_use":
+                            # Convert to OpenAI tool_call format for compatibility
+                            tool_calls.append({
+                                "id": part["id"],
+                                "type": "function",
+                                "function": {
+                                    "name": part["name"],
+                                    "arguments": _dumps_str(part["input"]),
+                                }
+                            })
+
+                    tokens_in = data.get("usage", {}).get("input_tokens", 0)
+                    tokens_out = data.get("usage", {}).get("output_tokens", 0)
+
+                    return AIResponse(
+                        success=True,
+                        content="".join(texts),
+                        provider=self.name,
+                        model=model,
+                        tokens_used=tokens_in + tokens_out,
+                        latency=latency,
+                        tool_calls=tool_calls if tool_calls else None,
+                        raw=data if kwargs.get("_debug") else None,
+                    )
+                else:
+                    error_text = await _safe_err_text(resp)
+                    log.warning(f"Anthropic error {resp.status}: {error_text[:200]}")
+                    return AIResponse(
+                        success=False, content="",
+                        provider=self.name, model=model,
+                        error=f"HTTP {resp.status}: {error_text[:100]}",
+                        latency=latency,
+                    )
 
         except asyncio.TimeoutError:
-            return AIResponse(
-                success=False, content="", provider=self.name,
-                model=model, error="Request timeout"
-            )
+            return self._fail(model, "Request timeout")
         except Exception as e:
             log.error(f"Anthropic exception: {e}")
-            return AIResponse(
-                success=False, content="", provider=self.name,
-                model=model, error=str(e)
-            )
+            return self._fail(model, str(e))
 
 
 # ============================================================
@@ -507,137 +1045,66 @@ class OpenRouterProvider(OpenAICompatibleProvider):
         super().__init__(api_key)
         self.name = "openrouter"
         self.endpoint = "https://openrouter.ai/api/v1/chat/completions"
+        self._headers = {
+            **super()._build_headers(),
+            "HTTP-Referer": "https://discord-bot.local",
+            "X-Title": "Discord AI Bot",
+        }
 
-    def _build_headers(self) -> Dict[str, str]:
-        headers = super()._build_headers()
-        headers["HTTP-Referer"] = "https://discord-bot.local"
-        headers["X-Title"] = "Discord AI Bot"
-        return headers
+    # Model OpenRouter dengan tools=True di config — dibangun sekali, lalu cukup lookup set
+    _TOOLS_SAFE_MODELS: Optional[frozenset] = None
 
     def _model_supports_tools(self, model: str) -> bool:
         """
         FIX #4: Cek tools=True dari config, bukan hardcoded whitelist.
         Otomatis sinkron setiap kali config.py di-update.
         """
-        try:
-            from config import get_model as _get_model
-            model_info = _get_model("openrouter", model)
-            return model_info is not None and model_info.tools
-        except Exception:
-            return False
-
-    async def chat(
-        self,
-        messages: List[Dict[str, str]],
-        model: str,
-        temperature: float = 0.7,
-        max_tokens: int = 4096,
-        **kwargs
-    ) -> AIResponse:
-        import time
-        start = time.time()
-
-        payload = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature,
-            "max_tokens": max_tokens,
-        }
-
+        cls = type(self)
+        if cls._TOOLS_SAFE_MODELS is None:
+            try:
+                from config import get_provider
+                prov = get_provider("openrouter")
+                cls._TOOLS_SAFE_MODELS = frozenset(m.id for m in prov.models if m.tools) if prov else frozenset()
+            except Exception:
+                cls._TOOLS_SAFE_MODELS = frozenset()
+        return model in cls._TOOLS_SAFE_MODELS
+
+    def _allow_tools(self, model: str) -> bool:
         # FIX #4: Dinamis dari config, bukan hardcoded whitelist
-        if kwargs.get("tools") and self._model_supports_tools(model):
-            payload["tools"] = kwargs["tools"]
-            payload["tool_choice"] = kwargs.get("tool_choice", "auto")
-
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.endpoint,
-                    headers=self._build_headers(),
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=60)
-                ) as resp:
-                    latency = time.time() - start
-
-                    if resp.status == 200:
-                        data = await resp.json()
-                        msg = data["choices"][0].get("message", {})
-                        content = msg.get("content") or ""
-                        tool_calls = msg.get("tool_calls")
-                        tokens = data.get("usage", {}).get("total_tokens", 0)
-
-                        return AIResponse(
-                            success=True, content=content,
-                            provider=self.name, model=model,
-                            tokens_used=tokens, latency=latency,
-                            tool_calls=tool_calls, raw=data
-                        )
-
-                    # 404: Model deprecated → fallback to openrouter/free
-                    elif resp.status == 404 and model != "openrouter/free":
-                        error_text = await resp.text()
-                        log.warning(f"OpenRouter 404 for {model}, fallback to openrouter/free")
-
-                        payload["model"] = "openrouter/free"
-                        async with session.post(
-                            self.endpoint,
-                            headers=self._build_headers(),
-                            json=payload,
-                            timeout=aiohttp.ClientTimeout(total=60)
-                        ) as retry:
-                            retry_latency = time.time() - start
-                            if retry.status == 200:
-                                data = await retry.json()
-                                msg = data["choices"][0].get("message", {})
-                                content = msg.get("content") or ""
-                                tool_calls = msg.get("tool_calls")
-                                tokens = data.get("usage", {}).get("total_tokens", 0)
-                                return AIResponse(
-                                    success=True, content=content,
-                                    provider=self.name, model="openrouter/free",
-                                    tokens_used=tokens, latency=retry_latency,
-                                    tool_calls=tool_calls, raw=data
-                                )
-                            else:
-                                return AIResponse(
-                                    success=False, content="",
-                                    provider=self.name, model=model,
-                                    error=f"Fallback failed: HTTP {retry.status}",
-                                    latency=retry_latency
-                                )
-
-                    # 429: Rate limited
-                    elif resp.status == 429:
-                        error_text = await resp.text()
-                        log.warning(f"OpenRouter 429 for {model}")
-                        return AIResponse(
-                            success=False, content="",
-                            provider=self.name, model=model,
-                            error="Rate limited (429). Try again later.",
-                            latency=latency
-                        )
-
-                    else:
-                        error_text = await resp.text()
-                        log.warning(f"OpenRouter error {resp.status}: {error_text[:200]}")
-                        return AIResponse(
-                            success=False, content="",
-                            provider=self.name, model=model,
-                            error=f"HTTP {resp.status}: {error_text[:100]}",
-                            latency=latency
-                        )
-
-        except asyncio.TimeoutError:
+        return self._model_supports_tools(model)
+
+    def _prepare_messages(self, messages: List[Dict], model: str) -> List[Dict]:
+        if not model.startswith("anthropic/"):
+            return messages
+        # OpenRouter meneruskan cache_control ke Anthropic → system prompt jadi cached prefix
+        messages = self._normalize_for_cache(messages)
+        if messages and messages[0]["role"] == "system":
+            messages = [{"role": "system", "content": [
+                {"type": "text", "text": messages[0]["content"], "cache_control": {"type": "ephemeral"}}
+            ]}, *messages[1:]]
+        return messages
+
+    async def _on_error(self, status: int, payload: Dict, start: float,
+                        kwargs: Dict) -> Optional[AIResponse]:
+        model = payload["model"]
+
+        # 404: Model deprecated → fallback to openrouter/free (tanpa streaming, parse JSON biasa)
+        if status == 404 and model != "openrouter/free":
+            log.warning(f"OpenRouter 404 for {model}, fallback to openrouter/free")
+            retry = {**payload, "model": "openrouter/free"}
+            retry.pop("stream", None)
+            return await self._post(retry, "openrouter/free", start, kwargs)
+
+        # 429: Rate limited
+        if status == 429:
+            log.warning(f"OpenRouter 429 for {model}")
             return AIResponse(
-                success=False, content="", provider=self.name,
-                model=model, error="Request timeout"
-            )
-        except Exception as e:
-            log.error(f"OpenRouter exception: {e}")
-            return AIResponse(
-                success=False, content="", provider=self.name,
-                model=model, error=str(e)
+                success=False, content="",
+                provider=self.name, model=model,
+                error="Rate limited (429). Try again later.",
+                latency=time.perf_counter() - start
             )
+        return None
 
 
 # ============================================================
@@ -652,13 +1119,7 @@ class PollinationsProvider(OpenAICompatibleProvider):
         self.name = "pollinations"
         self.endpoint = "https://gen.pollinations.ai/v1/chat/completions"
 
-    def _build_headers(self) -> Dict[str, str]:
-        headers = {"Content-Type": "application/json"}
-        if self.api_key:
-            headers["Authorization"] = f"Bearer {self.api_key}"
-        return headers
-
-    async def health_check(self) -> bool:
+    async def _probe(self) -> bool:
         return True
 
 
@@ -701,18 +1162,45 @@ class HuggingFaceProvider(OpenAICompatibleProvider):
         self.endpoint = "https://router.huggingface.co/v1/chat/completions"
 
 
+# ============================================================
+# TOOL SCHEMA CONVERSION CACHE
+# ============================================================
+
+def _memo_tools(convert):
+    """Cache hasil konversi per objek tools list (TOOLS_LIST di handler statis).
+    Simpan referensi list-nya juga supaya id() tidak bisa dipakai ulang objek lain"""
+    memo: Dict[int, tuple] = {}
+
+    @functools.wraps(convert)
+    def wrapper(self, openai_tools):
+        hit = memo.get(id(openai_tools))
+        if hit is not None and hit[0] is openai_tools:
+            return hit[1]
+        converted = convert(self, openai_tools)
+        if len(memo) >= 32:
+            memo.clear()
+        memo[id(openai_tools)] = (openai_tools, converted)
+        return converted
+    return wrapper
+
+
 # ============================================================
 # COHERE PROVIDER — Full Tool Calling Support
 # ============================================================
 
+_COHERE_ROLES = {"system": "system", "assistant": "assistant"}
+
 class CohereProvider(BaseProvider):
-    """Cohere API v2 — with function calling support"""
+    """Cohere API v2 — with function calling support.
+    on_partial (tanpa tools) → stream=true SSE; chat_stream() yields the raw deltas"""
 
     def __init__(self, api_key: str):
         super().__init__(api_key)
         self.name = "cohere"
         self.endpoint = "https://api.cohere.ai/v2/chat"
+        self._headers = {**super()._build_headers(), "X-Client-Name": "discord-bot"}
 
+    @_memo_tools
     def _convert_tools_to_cohere(self, openai_tools):
         cohere_tools = []
         for tool in openai_tools:
@@ -728,20 +1216,11 @@ class CohereProvider(BaseProvider):
                 })
         return cohere_tools
 
-    async def chat(self, messages, model, temperature=0.7, max_tokens=4096, **kwargs):
-        import time as _time
-        start = _time.time()
-
-        cohere_messages = []
-        for msg in messages:
-            role = msg["role"]
-            if role == "system":
-                role = "system"
-            elif role == "assistant":
-                role = "assistant"
-            else:
-                role = "user"
-            cohere_messages.append({"role": role, "content": msg["content"]})
+    def _build_payload(self, messages, model, temperature, max_tokens, kwargs) -> Dict:
+        cohere_messages = [
+            {"role": _COHERE_ROLES.get(m["role"], "user"), "content": m["content"]}
+            for m in messages
+        ]
 
         payload = {
             "model": model,
@@ -755,60 +1234,109 @@ class CohereProvider(BaseProvider):
             cohere_tools = self._convert_tools_to_cohere(kwargs["tools"])
             if cohere_tools:
                 payload["tools"] = cohere_tools
+        return payload
+
+    @staticmethod
+    def _sse_delta(chunk: Dict) -> str:
+        if chunk.get("type") != "content-delta":
+            return ""
+        content = ((chunk.get("delta") or {}).get("message") or {}).get("content") or {}
+        return content.get("text", "")
+
+    async def _read_sse(self, resp, on_partial) -> tuple:
+        """Parse Cohere v2 stream events (content-delta / message-end). Returns (content, total_tokens)"""
+        content = ""
+        tokens = 0
+        async for chunk in _iter_sse(resp):
+            delta = self._sse_delta(chunk)
+            if delta:
+                content += delta
+                await on_partial(content)
+            elif chunk.get("type") == "message-end":
+                usage = ((chunk.get("delta") or {}).get("usage") or {}).get("tokens", {})
+                tokens = usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+        return content, tokens
+
+    async def chat_stream(self, messages, model, temperature=0.7, max_tokens=4096, **kwargs) -> AsyncIterator[str]:
+        """Async generator of text deltas (stream=true). Raises RuntimeError on non-200."""
+        kwargs.pop("tools", None)
+        payload = self._build_payload(messages, model, temperature, max_tokens, kwargs)
+        payload["stream"] = True
+        session = await self._session()
+        async with session.post(self.endpoint, headers=self._build_headers(), data=_dumps(payload),
+                                timeout=self.TIMEOUT) as resp:
+            if resp.status != 200:
+                error_text = await _safe_err_text(resp)
+                raise RuntimeError(f"{self.name} HTTP {resp.status}: {error_text[:100]}")
+            async for chunk in _iter_sse(resp):
+                delta = self._sse_delta(chunk)
+                if delta:
+                    yield delta
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}",
-            "X-Client-Name": "discord-bot"
-        }
+    async def chat(self, messages, model, temperature=0.7, max_tokens=4096, **kwargs):
+        start = time.perf_counter()
+        payload = self._build_payload(messages, model, temperature, max_tokens, kwargs)
+
+        on_partial = kwargs.get("on_partial")
+        stream = on_partial is not None and "tools" not in payload
+        if stream:
+            payload["stream"] = True
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.endpoint, headers=headers, json=payload,
-                                        timeout=aiohttp.ClientTimeout(total=60)) as resp:
-                    latency = _time.time() - start
-                    if resp.status == 200:
-                        data = await resp.json()
-                        message = data.get("message", {})
-                        content_parts = message.get("content", [])
-
-                        text_content = ""
-                        for part in content_parts:
-                            if isinstance(part, dict) and "text" in part:
-                                text_content += part["text"]
-                            elif isinstance(part, str):
-                                text_content += part
-
-                        tool_calls = None
-                        cohere_tc = message.get("tool_calls", [])
-                        if cohere_tc:
-                            tool_calls = []
-                            for i, tc in enumerate(cohere_tc):
-                                tool_calls.append({
-                                    "id": tc.get("id", f"call_{i}"),
-                                    "type": "function",
-                                    "function": {
-                                        "name": tc["function"]["name"],
-                                        "arguments": tc["function"].get("arguments", "{}")
-                                    }
-                                })
-
-                        usage = data.get("usage", {}).get("tokens", {})
-                        tokens = usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
-
-                        return AIResponse(
-                            success=True, content=text_content, provider=self.name, model=model,
-                            tokens_used=tokens, latency=latency, tool_calls=tool_calls, raw=data
-                        )
-                    else:
-                        error_text = await resp.text()
-                        log.warning(f"Cohere error {resp.status}: {error_text[:200]}")
-                        return AIResponse(
-                            success=False, content="", provider=self.name, model=model,
-                            error=f"HTTP {resp.status}: {error_text[:100]}", latency=latency
-                        )
+            session = await self._session()
+            async with session.post(self.endpoint, headers=self._build_headers(), data=_dumps(payload),
+                                    timeout=self.TIMEOUT) as resp:
+                latency = time.perf_counter() - start
+                if resp.status == 200 and stream and resp.content_type == "text/event-stream":
+                    content, tokens = await self._read_sse(resp, on_partial)
+                    return AIResponse(
+                        success=True, content=content, provider=self.name, model=model,
+                        tokens_used=tokens, latency=time.perf_counter() - start
+                    )
+                if resp.status == 200:
+                    data = await _read_json(resp)
+                    message = data.get("message", {})
+                    content_parts = message.get("content", [])
+
+                    texts = []
+                    for part in content_parts:
+                        if isinstance(part, dict) and "text" in part:
+                            texts.append(part["text"])
+                        elif isinstance(part, str):
+                            texts.append(part)
+                    text_content = "".join(texts)
+
+                    tool_calls = None
+                    cohere_tc = message.get("tool_calls", [])
+                    if cohere_tc:
+                        tool_calls = []
+                        for i, tc in enumerate(cohere_tc):
+                            tool_calls.append({
+                                "id": tc.get("id", f"call_{i}"),
+                                "type": "function",
+                                "function": {
+                                    "name": tc["function"]["name"],
+                                    "arguments": tc["function"].get("arguments", "{}")
+                                }
+                            })
+
+                    usage = data.get("usage", {}).get("tokens", {})
+                    tokens = usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+
+                    return AIResponse(
+                        success=True, content=text_content, provider=self.name, model=model,
+                        tokens_used=tokens, latency=latency, tool_calls=tool_calls,
+                        raw=data if kwargs.get("_debug") else None
+                    )
+                else:
+                    error_text = await _safe_err_text(resp)
+                    log.warning(f"Cohere error {resp.status}: {error_text[:200]}")
+                    return AIResponse(
+                        success=False, content="", provider=self.name, model=model,
+                        error=f"HTTP {resp.status}: {error_text[:100]}", latency=latency
+                    )
         except Exception as e:
-            return AIResponse(success=False, content="", provider=self.name, model=model, error=str(e))
+            return self._fail(model, str(e))
 
 
 # ============================================================
@@ -845,14 +1373,93 @@ class RoutewayProvider(OpenAICompatibleProvider):
 # GEMINI PROVIDER — Full Tool Calling Support
 # ============================================================
 
+_GEMINI_ROLES = {"user": "user"}  # selain user (assistant/tool) → "model"
+
 class GeminiProvider(BaseProvider):
-    """Google Gemini API — with function calling support"""
+    """Google Gemini API — with function calling support.
+    on_partial (tanpa tools) → streamGenerateContent?alt=sse, delta teks langsung ke callback;
+    chat_stream() yields the raw deltas instead"""
+
+    POOL_SIZE = 8
 
     def __init__(self, api_key: str):
         super().__init__(api_key)
         self.name = "gemini"
         self.base_url = "https://generativelanguage.googleapis.com/v1beta/models"
+        # Key lewat header (bukan Bearer / query string) → URL konstan per model, key tidak bocor ke log error
+        self._headers = {"Content-Type": "application/json", "x-goog-api-key": api_key}
+        self._endpoints: Dict[tuple, str] = {}
+
+    @staticmethod
+    def _sse_delta(chunk: Dict) -> str:
+        candidates = chunk.get("candidates")
+        if not candidates:
+            return ""
+        parts = (candidates[0].get("content") or {}).get("parts", ())
+        return "".join([p["text"] for p in parts if "text" in p])
+
+    async def _read_sse(self, resp, on_partial) -> tuple:
+        """Parse streamGenerateContent SSE: tiap frame = GenerateContentResponse parsial.
+        Returns (content, total_tokens)"""
+        content = ""
+        tokens = 0
+        async for chunk in _iter_sse(resp):
+            delta = self._sse_delta(chunk)
+            if delta:
+                content += delta
+                await on_partial(content)
+            tokens = (chunk.get("usageMetadata") or {}).get("totalTokenCount", tokens)
+        return content, tokens
+
+    def _endpoint(self, model: str, stream: bool) -> str:
+        endpoint = self._endpoints.get((model, stream))
+        if endpoint is None:
+            method = "streamGenerateContent?alt=sse" if stream else "generateContent"
+            endpoint = self._endpoints[(model, stream)] = f"{self.base_url}/{model}:{method}"
+        return endpoint
+
+    def _build_payload(self, messages, temperature, max_tokens, kwargs) -> Dict:
+        contents = [
+            {"role": _GEMINI_ROLES.get(m["role"], "model"), "parts": [{"text": m["content"]}]}
+            for m in messages if m["role"] != "system"
+        ]
+        # Pesan system terakhir yang menang (sama seperti sebelumnya)
+        system_instruction = next((m["content"] for m in reversed(messages) if m["role"] == "system"), None)
+
+        payload = {
+            "contents": contents,
+            "generationConfig": {"temperature": temperature, "maxOutputTokens": max_tokens}
+        }
+
+        if system_instruction:
+            payload["systemInstruction"] = {"parts": [{"text": system_instruction}]}
 
+        # Tool calling support
+        if kwargs.get("tools"):
+            gemini_tools = self._convert_tools_to_gemini(kwargs["tools"])
+            if gemini_tools:
+                payload["tools"] = gemini_tools
+                payload["toolConfig"] = {"functionCallingConfig": {"mode": "AUTO"}}
+        elif kwargs.get("search") or kwargs.get("grounding"):
+            payload["tools"] = [{"google_search": {}}]
+        return payload
+
+    async def chat_stream(self, messages, model, temperature=0.7, max_tokens=4096, **kwargs) -> AsyncIterator[str]:
+        """Async generator of text deltas (streamGenerateContent). Raises RuntimeError on non-200."""
+        kwargs.pop("tools", None)
+        payload = self._build_payload(messages, temperature, max_tokens, kwargs)
+        session = await self._session()
+        async with session.post(self._endpoint(model, True), headers=self._build_headers(),
+                                data=_dumps(payload), timeout=self.TIMEOUT) as resp:
+            if resp.status != 200:
+                error_text = await _safe_err_text(resp)
+                raise RuntimeError(f"{self.name} HTTP {resp.status}: {error_text[:100]}")
+            async for chunk in _iter_sse(resp):
+                delta = self._sse_delta(chunk)
+                if delta:
+                    yield delta
+
+    @_memo_tools
     def _convert_tools_to_gemini(self, openai_tools):
         declarations = []
         for tool in openai_tools:
@@ -867,76 +1474,58 @@ class GeminiProvider(BaseProvider):
 
     def _convert_tool_calls_to_openai(self, parts):
         tool_calls = []
-        for i, part in enumerate(parts):
+        for part in parts:
             if "functionCall" in part:
                 fc = part["functionCall"]
                 fc_name = fc.get("name", "unknown")
-                call_id = "call_" + hashlib.md5(f"{fc_name}_{i}".encode()).hexdigest()[:12]
+                call_id = "call_" + secrets.token_hex(6)
                 tool_calls.append({
                     "id": call_id,
                     "type": "function",
                     "function": {
                         "name": fc_name,
-                        "arguments": json.dumps(fc.get("args", {}))
+                        "arguments": _dumps_str(fc.get("args", {}))
                     }
                 })
         return tool_calls
 
     async def chat(self, messages, model, temperature=0.7, max_tokens=4096, **kwargs):
-        import time as _time
-        start = _time.time()
-        contents = []
-        system_instruction = None
-
-        for msg in messages:
-            if msg["role"] == "system":
-                system_instruction = msg["content"]
-            else:
-                role = "user" if msg["role"] == "user" else "model"
-                contents.append({"role": role, "parts": [{"text": msg["content"]}]})
-
-        endpoint = f"{self.base_url}/{model}:generateContent?key={self.api_key}"
-        payload = {
-            "contents": contents,
-            "generationConfig": {"temperature": temperature, "maxOutputTokens": max_tokens}
-        }
-
-        if system_instruction:
-            payload["systemInstruction"] = {"parts": [{"text": system_instruction}]}
-
-        # Tool calling support
-        if kwargs.get("tools"):
-            gemini_tools = self._convert_tools_to_gemini(kwargs["tools"])
-            if gemini_tools:
-                payload["tools"] = gemini_tools
-                payload["toolConfig"] = {"functionCallingConfig": {"mode": "AUTO"}}
-        elif kwargs.get("search") or kwargs.get("grounding"):
-            payload["tools"] = [{"google_search": {}}]
+        start = time.perf_counter()
+        on_partial = kwargs.get("on_partial")
+        stream = on_partial is not None and not kwargs.get("tools")
+        endpoint = self._endpoint(model, stream)
+        payload = self._build_payload(messages, temperature, max_tokens, kwargs)
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(endpoint, headers={"Content-Type": "application/json"},
-                                        json=payload, timeout=aiohttp.ClientTimeout(total=60)) as resp:
-                    latency = _time.time() - start
-                    if resp.status == 200:
-                        data = await resp.json()
-                        parts = data["candidates"][0]["content"]["parts"]
-                        text_content = "".join(p.get("text", "") for p in parts if "text" in p)
-                        tool_calls = self._convert_tool_calls_to_openai(parts)
-                        tokens = data.get("usageMetadata", {}).get("totalTokenCount", 0)
-                        return AIResponse(
-                            success=True, content=text_content, provider=self.name, model=model,
-                            tokens_used=tokens, latency=latency,
-                            tool_calls=tool_calls if tool_calls else None, raw=data
-                        )
-                    else:
-                        error_text = await resp.text()
-                        return AIResponse(
-                            success=False, content="", provider=self.name, model=model,
-                            error=f"HTTP {resp.status}: {error_text[:100]}", latency=latency
-                        )
+            session = await self._session()
+            async with session.post(endpoint, headers=self._build_headers(),
+                                    data=_dumps(payload), timeout=self.TIMEOUT) as resp:
+                latency = time.perf_counter() - start
+                if resp.status == 200 and stream and resp.content_type == "text/event-stream":
+                    content, tokens = await self._read_sse(resp, on_partial)
+                    return AIResponse(
+                        success=True, content=content, provider=self.name, model=model,
+                        tokens_used=tokens, latency=time.perf_counter() - start
+                    )
+                if resp.status == 200:
+                    data = await _read_json(resp)
+                    parts = data["candidates"][0]["content"]["parts"]
+                    text_content = "".join([p["text"] for p in parts if "text" in p])
+                    tool_calls = self._convert_tool_calls_to_openai(parts)
+                    tokens = data.get("usageMetadata", {}).get("totalTokenCount", 0)
+                    return AIResponse(
+                        success=True, content=text_content, provider=self.name, model=model,
+                        tokens_used=tokens, latency=latency,
+                        tool_calls=tool_calls if tool_calls else None, raw=data if kwargs.get("_debug") else None
+                    )
+                else:
+                    error_text = await _safe_err_text(resp)
+                    return AIResponse(
+                        success=False, content="", provider=self.name, model=model,
+                        error=f"HTTP {resp.status}: {error_text[:100]}", latency=latency
+                    )
         except Exception as e:
-            return AIResponse(success=False, content="", provider=self.name, model=model, error=str(e))
+            return self._fail(model, str(e))
 
 
 # ============================================================
@@ -960,41 +1549,32 @@ class CloudflareProvider(BaseProvider):
         max_tokens: int = 4096,
         **kwargs
     ) -> AIResponse:
-        import time
-        start = time.time()
+        start = time.perf_counter()
 
         endpoint = f"{self.base_url}/{model}"
         payload = {"messages": messages, "max_tokens": max_tokens}
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    endpoint, headers=headers, json=payload,
-                    timeout=aiohttp.ClientTimeout(total=60)
-                ) as resp:
-                    latency = time.time() - start
-                    if resp.status == 200:
-                        data = await resp.json()
-                        content = data["result"]["response"]
-                        return AIResponse(
-                            success=True, content=content,
-                            provider=self.name, model=model, latency=latency
-                        )
-                    else:
-                        return AIResponse(
-                            success=False, content="",
-                            provider=self.name, model=model,
-                            error=f"HTTP {resp.status}", latency=latency
-                        )
+            session = await self._session()
+            async with session.post(
+                endpoint, headers=self._build_headers(), data=_dumps(payload),
+                timeout=self.TIMEOUT
+            ) as resp:
+                latency = time.perf_counter() - start
+                if resp.status == 200:
+                    data = await _read_json(resp)
+                    content = data["result"]["response"]
+                    return AIResponse(
+                        success=True, content=content,
+                        provider=self.name, model=model, latency=latency
+                    )
+                else:
+                    return AIResponse(
+                        success=False, content="",
+                        provider=self.name, model=model,
+                        error=f"HTTP {resp.status}", latency=latency
+                    )
         except Exception as e:
-            return AIResponse(
-                success=False, content="",
-                provider=self.name, model=model, error=str(e)
-            )
+            return self._fail(model, str(e))
 
 
 # ============================================================
@@ -1010,44 +1590,43 @@ class MLVOCAProvider(BaseProvider):
         self.endpoint = "https://mlvoca.com/api/generate"
 
     async def chat(self, messages: List[Dict[str, str]], model: str, **kwargs) -> AIResponse:
-        import time
-        start = time.time()
+        start = time.perf_counter()
 
         prompt = messages[-1]["content"] if messages else ""
-        for msg in messages:
-            if msg["role"] == "system":
-                prompt = f"{msg['content']}\n\n{prompt}"
-                break
+        # System prompt hampir selalu di index 0 → cek itu dulu sebelum scan
+        if messages and messages[0]["role"] == "system":
+            system = messages[0]["content"]
+        else:
+            system = next((m["content"] for m in messages if m["role"] == "system"), None)
+        if system:
+            prompt = "\n\n".join((system, prompt))
 
         payload = {"model": model, "prompt": prompt, "stream": False}
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.endpoint, json=payload,
-                    timeout=aiohttp.ClientTimeout(total=60)
-                ) as resp:
-                    latency = time.time() - start
-                    if resp.status == 200:
-                        data = await resp.json()
-                        content = data.get("response", "")
-                        return AIResponse(
-                            success=True, content=content,
-                            provider=self.name, model=model, latency=latency
-                        )
-                    else:
-                        return AIResponse(
-                            success=False, content="",
-                            provider=self.name, model=model,
-                            error=f"HTTP {resp.status}", latency=latency
-                        )
+            session = await self._session()
+            async with session.post(
+                self.endpoint, headers=self._build_headers(), data=_dumps(payload),
+                timeout=self.TIMEOUT
+            ) as resp:
+                latency = time.perf_counter() - start
+                if resp.status == 200:
+                    data = await _read_json(resp)
+                    content = data.get("response", "")
+                    return AIResponse(
+                        success=True, content=content,
+                        provider=self.name, model=model, latency=latency
+                    )
+                else:
+                    return AIResponse(
+                        success=False, content="",
+                        provider=self.name, model=model,
+                        error=f"HTTP {resp.status}", latency=latency
+                    )
         except Exception as e:
-            return AIResponse(
-                success=False, content="",
-                provider=self.name, model=model, error=str(e)
-            )
+            return self._fail(model, str(e))
 
-    async def health_check(self) -> bool:
+    async def _probe(self) -> bool:
         return True
 
 
@@ -1055,77 +1634,95 @@ class MLVOCAProvider(BaseProvider):
 # PUTER PROVIDER
 # ============================================================
 
+# Prefix model → driver Puter, dicek berurutan (fallback "openai-completion")
+_PUTER_DRIVERS = (
+    (("claude",), "claude"),
+    (("google/", "gemini"), "google-vertex"),
+    (("x-ai/", "grok"), "xai"),
+    (("deepseek",), "deepseek"),
+    (("meta-llama", "llama"), "together-ai"),
+    (("mistral",), "mistral"),
+    (("perplexity",), "perplexity"),
+    (("z-ai/", "glm"), "zhipuai"),
+)
+
+@functools.lru_cache(maxsize=256)
+def _puter_driver(model: str) -> str:
+    return next((driver for prefixes, driver in _PUTER_DRIVERS if model.startswith(prefixes)), "openai-completion")
+
+
+@functools.lru_cache(maxsize=None)
+def _puter_envelope(driver: str) -> bytes:
+    """Prefix JSON statis request Puter per driver (sampai key "args"), di-encode sekali"""
+    return _dumps({"interface": "puter-chat-completion", "driver": driver, "test_mode": False,
+                   "method": "complete", "args": None})[:-len(b"null}")]
+
+
+# Bentuk response Puter beda-beda per driver — path dicoba berurutan, yang pertama cocok dipakai
+_PUTER_PATHS = (
+    ("result", "message", "content"),
+    ("result", "choices", 0, "message", "content"),
+    ("result",),                    # beberapa driver balikin string langsung
+    ("message", "content"),
+)
+
+def _puter_content(data) -> Optional[str]:
+    """Teks jawaban Puter, atau None kalau bentuk response tidak dikenal"""
+    for path in _PUTER_PATHS:
+        value = data
+        try:
+            for key in path:
+                value = value[key]
+        except (KeyError, TypeError, IndexError):
+            continue
+        if isinstance(value, str):
+            return value
+        if isinstance(value, list):  # content blocks ala Anthropic (driver claude)
+            return "".join([b["text"] for b in value if isinstance(b, dict) and "text" in b])
+    return None
+
+
 class PuterProvider(BaseProvider):
     """Puter.com API - Free 200+ AI models"""
 
+    TIMEOUT = aiohttp.ClientTimeout(total=90, connect=10, sock_connect=3)
+
     def __init__(self, api_token: str = None):
         super().__init__(api_token)
         self.name = "puter"
         self.api_token = api_token
         self.base_url = "https://api.puter.com"
+        self._headers = {**super()._build_headers(), "Origin": "https://puter.com"}
+        self._call_url = f"{self.base_url}/drivers/call"
 
     async def chat(self, messages: List[Dict[str, str]], model: str, temperature: float = 0.7, max_tokens: int = 4096, **kwargs) -> AIResponse:
-        import time
-        start = time.time()
+        start = time.perf_counter()
 
         if not self.api_token:
-            return AIResponse(success=False, content="", provider=self.name, model=model, error="Puter API token not provided")
-
-        # Determine driver - FIXED
-        if model.startswith("claude"):
-            driver = "claude"
-        elif model.startswith("google/") or model.startswith("gemini"):
-            driver = "google-vertex"
-        elif model.startswith("x-ai/") or model.startswith("grok"):
-            driver = "xai"
-        elif model.startswith("deepseek"):
-            driver = "deepseek"
-        elif model.startswith("meta-llama") or model.startswith("llama"):
-            driver = "together-ai"
-        elif model.startswith("mistral"):
-            driver = "mistral"
-        elif model.startswith("perplexity"):
-            driver = "perplexity"
-        elif model.startswith("z-ai/") or model.startswith("glm"):
-            driver = "zhipuai"
-        else:
-            driver = "openai-completion"
-
-        payload = {"interface": "puter-chat-completion", "driver": driver, "test_mode": False, "method": "complete", "args": {"messages": messages, "model": model, "stream": False}}
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_token}", "Origin": "https://puter.com"}
+            return self._fail(model, "Puter API token not provided")
 
+        # Envelope statis per driver sudah di-encode; cuma args yang di-serialize per call
+        body = _puter_envelope(_puter_driver(model)) + _dumps({"messages": messages, "model": model, "stream": False}) + b"}"
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{self.base_url}/drivers/call", headers=headers, json=payload, timeout=aiohttp.ClientTimeout(total=90)) as resp:
-                    latency = time.time() - start
-                    if resp.status == 200:
-                        data = await resp.json()
-                        try:
-                            if "result" in data:
-                                result = data["result"]
-                                if "message" in result:
-                                    content = result["message"].get("content", "")
-                                elif "choices" in result:
-                                    content = result["choices"][0]["message"]["content"]
-                                else:
-                                    content = str(result)
-                            elif "message" in data:
-                                content = data["message"].get("content", str(data))
-                            else:
-                                content = str(data)
-                        except:
-                            content = str(data)
-                        return AIResponse(success=True, content=content, provider=self.name, model=model, latency=latency)
-                    else:
-                        error_text = await resp.text()
-                        return AIResponse(success=False, content="", provider=self.name, model=model, error=f"HTTP {resp.status}: {error_text[:100]}", latency=latency)
+            session = await self._session()
+            async with session.post(self._call_url, headers=self._build_headers(), data=body, timeout=self.TIMEOUT) as resp:
+                latency = time.perf_counter() - start
+                if resp.status == 200:
+                    data = await _read_json(resp)
+                    content = _puter_content(data)
+                    if content is None:
+                        return AIResponse(success=False, content="", provider=self.name, model=model, error="Unrecognized Puter response shape", latency=latency)
+                    return AIResponse(success=True, content=content, provider=self.name, model=model, latency=latency)
+                else:
+                    error_text = await _safe_err_text(resp)
+                    return AIResponse(success=False, content="", provider=self.name, model=model, error=f"HTTP {resp.status}: {error_text[:100]}", latency=latency)
         except asyncio.TimeoutError:
-            return AIResponse(success=False, content="", provider=self.name, model=model, error="Request timeout")
+            return self._fail(model, "Request timeout")
         except Exception as e:
             log.error(f"Puter exception: {e}")
-            return AIResponse(success=False, content="", provider=self.name, model=model, error=str(e))
+            return self._fail(model, str(e))
 
-    async def health_check(self) -> bool:
+    async def _probe(self) -> bool:
         return self.api_token is not None
 
 
@@ -1133,127 +1730,112 @@ class PuterProvider(BaseProvider):
 # PROVIDER FACTORY — Updated with ALL providers
 # ============================================================
 
+def _build_local(api_keys: Dict[str, str]) -> BaseProvider:
+    try:
+        from config import OLLAMA_BASE_URL, OLLAMA_CTX_SIZE
+        return LocalOllamaProvider(base_url=OLLAMA_BASE_URL, ctx_size=OLLAMA_CTX_SIZE)
+    except ImportError:
+        # Fallback defaults if config vars not available
+        return LocalOllamaProvider()
+
+def _build_cloudflare(api_keys: Dict[str, str]) -> Optional[BaseProvider]:
+    key, account = api_keys.get("cloudflare"), api_keys.get("cloudflare_account")
+    return CloudflareProvider(key, account) if key and account else None
+
+def _build_puter(api_keys: Dict[str, str]) -> Optional[BaseProvider]:
+    token = api_keys.get("puter_api_key") or api_keys.get("puter")
+    return PuterProvider(token) if token else None
+
+# Provider yang cukup 1 API key dengan nama yang sama
+_KEYED_PROVIDERS = {
+    "groq": GroqProvider, "openrouter": OpenRouterProvider, "gemini": GeminiProvider,
+    "cerebras": CerebrasProvider, "sambanova": SambanovaProvider, "huggingface": HuggingFaceProvider,
+    "cohere": CohereProvider, "siliconflow": SiliconFlowProvider, "routeway": RoutewayProvider,
+    "mistral": MistralProvider, "nvidia": NvidiaProvider, "openai": OpenAIProvider,
+    "anthropic": AnthropicProvider, "xai": XAIProvider,
+}
+
+_BUILDERS: Dict[str, Callable[[Dict[str, str]], Optional[BaseProvider]]] = {
+    **{name: (lambda k, _name=name, _cls=klass: _cls(k[_name]) if k.get(_name) else None)
+       for name, klass in _KEYED_PROVIDERS.items()},
+    "local": _build_local,
+    "cloudflare": _build_cloudflare,
+    "puter": _build_puter,
+    # ── no key needed ──
+    "pollinations": lambda k: PollinationsProvider(k.get("pollinations")),
+    "mlvoca": lambda k: MLVOCAProvider(),
+}
+
+
+_WARMUP_TASKS: set = set()
+
+
+@functools.lru_cache(maxsize=256)
+def _make_provider(provider_name: str, keys_frozen: frozenset) -> Optional[BaseProvider]:
+    # Instance (atau None kalau key tidak ada) dibuat sekali per (nama, key set)
+    builder = _BUILDERS.get(provider_name)
+    provider = builder(dict(keys_frozen)) if builder else None
+    if provider is not None:
+        try:
+            task = asyncio.get_running_loop().create_task(provider.warmup())
+        except RuntimeError:
+            pass  # dipanggil di luar event loop → skip warmup
+        else:
+            _WARMUP_TASKS.add(task)
+            task.add_done_callback(_WARMUP_TASKS.discard)
+    return provider
+
+
 class ProviderFactory:
     """Factory to create provider instances"""
 
-    _instances: Dict[str, BaseProvider] = {}
-
     @classmethod
     def get(cls, provider_name: str, api_keys: Dict[str, str]) -> Optional[BaseProvider]:
-        if provider_name in cls._instances:
-            return cls._instances[provider_name]
-
-        provider = None
+        return _make_provider(provider_name, frozenset(api_keys.items()))
 
-        # ── LOCAL OLLAMA (no key needed) ───────────────────
-        if provider_name == "local":
-            try:
-                from config import OLLAMA_BASE_URL, OLLAMA_CTX_SIZE
-                provider = LocalOllamaProvider(
-                    base_url=OLLAMA_BASE_URL,
-                    ctx_size=OLLAMA_CTX_SIZE,
-                )
-            except ImportError:
-                # Fallback defaults if config vars not available
-                provider = LocalOllamaProvider()
-
-        elif provider_name == "groq":
-            key = api_keys.get("groq")
-            if key:
-                provider = GroqProvider(key)
-
-        elif provider_name == "openrouter":
-            key = api_keys.get("openrouter")
-            if key:
-                provider = OpenRouterProvider(key)
-
-        elif provider_name == "pollinations":
-            key = api_keys.get("pollinations")
-            provider = PollinationsProvider(key)
-
-        elif provider_name == "gemini":
-            key = api_keys.get("gemini")
-            if key:
-                provider = GeminiProvider(key)
-
-        elif provider_name == "cerebras":
-            key = api_keys.get("cerebras")
-            if key:
-                provider = CerebrasProvider(key)
-
-        elif provider_name == "sambanova":
-            key = api_keys.get("sambanova")
-            if key:
-                provider = SambanovaProvider(key)
-
-        elif provider_name == "cloudflare":
-            key = api_keys.get("cloudflare")
-            account = api_keys.get("cloudflare_account")
-            if key and account:
-                provider = CloudflareProvider(key, account)
-
-        elif provider_name == "huggingface":
-            key = api_keys.get("huggingface")
-            if key:
-                provider = HuggingFaceProvider(key)
-
-        elif provider_name == "cohere":
-            key = api_keys.get("cohere")
-            if key:
-                provider = CohereProvider(key)
-
-        elif provider_name == "siliconflow":
-            key = api_keys.get("siliconflow")
-            if key:
-                provider = SiliconFlowProvider(key)
-
-        elif provider_name == "routeway":
-            key = api_keys.get("routeway")
-            if key:
-                provider = RoutewayProvider(key)
-
-        # ── NEW PROVIDERS ──────────────────────────────────
-
-        elif provider_name == "mistral":
-            key = api_keys.get("mistral")
-            if key:
-                provider = MistralProvider(key)
-
-        elif provider_name == "nvidia":
-            key = api_keys.get("nvidia")
-            if key:
-                provider = NvidiaProvider(key)
-
-        elif provider_name == "openai":
-            key = api_keys.get("openai")
-            if key:
-                provider = OpenAIProvider(key)
-
-        elif provider_name == "anthropic":
-            key = api_keys.get("anthropic")
-            if key:
-                provider = AnthropicProvider(key)
-
-        elif provider_name == "xai":
-            key = api_keys.get("xai")
-            if key:
-                provider = XAIProvider(key)
-
-        # ── EXISTING (no key needed) ───────────────────────
-
-        elif provider_name == "mlvoca":
-            provider = MLVOCAProvider()
-
-        elif provider_name == "puter":
-            token = api_keys.get("puter_api_key") or api_keys.get("puter")
-            if token:
-                provider = PuterProvider(token)
-
-        if provider:
-            cls._instances[provider_name] = provider
-
-        return provider
+    @classmethod
+    async def race(cls, targets: List[Tuple[str, str]], api_keys: Dict[str, str],
+                   messages: List[Dict], max_in_flight: int = 3,
+                   **kwargs) -> Tuple[Optional[int], Optional[AIResponse], list]:
+        """Kirim prompt yang sama ke beberapa (provider, model) sekaligus, ambil yang pertama sukses.
+        Maksimal max_in_flight request jalan bersamaan; sisanya menunggu slot dari yang gagal.
+        Returns (winner_index, resp, [(index, failed_resp), ...]); sisanya di-cancel."""
+        sem = asyncio.Semaphore(max_in_flight)
+
+        async def _run(prov, mid):
+            async with sem:
+                return await prov.chat(messages, mid, **kwargs)
+
+        tasks = {}
+        failed = []
+        for i, (pname, mid) in enumerate(targets):
+            prov = cls.get(pname, api_keys)
+            if prov is None:
+                failed.append((i, AIResponse(False, "", pname, mid, error="provider unavailable")))
+                continue
+            tasks[asyncio.create_task(_run(prov, mid))] = i
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    i = tasks[t]
+                    try:
+                        resp = t.result()
+                    except Exception as e:
+                        resp = AIResponse(False, "", targets[i][0], targets[i][1], error=str(e))
+                    if resp.success:
+                        return i, resp, failed
+                    failed.append((i, resp))
+            return None, None, failed
+        finally:
+            # Menang, atau caller sendiri di-cancel (hedge kalah / timeout Discord):
+            # sisa task di-cancel dan ditunggu supaya koneksi + slot semaphore balik dengan rapi
+            for p in pending:
+                p.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
 
     @classmethod
     def clear_cache(cls):
-        cls._instances.clear()
+        _make_provider.cache_clear()
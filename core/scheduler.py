@@ -1,12 +1,22 @@
 """
 Background Scheduler for Reminders
-Runs as asyncio task, checks every 30 seconds
+Runs as asyncio task, sleeps until the next reminder is due (or until woken by a new one)
 """
 import asyncio
 import logging
+import time
 import discord
 from datetime import datetime
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Dict, Optional
+
+from core.database import claim_due_reminders, get_due_reminders, get_next_reminder_time
+
+try:
+    import wavelink
+    from music.player import MusicPlayer, get_player, set_player
+    MUSIC_AVAILABLE = True
+except ImportError:
+    MUSIC_AVAILABLE = False
 
 if TYPE_CHECKING:
     from discord import Client
@@ -17,7 +27,13 @@ class ReminderScheduler:
     def __init__(self, bot: "Client"):
         self.bot = bot
         self.running = False
-        self.check_interval = 30
+        self.max_sleep = 300  # re-sync berkala (reminder bisa diubah/dihapus langsung di DB)
+        self.max_concurrent = 8  # reminder yang dieksekusi bersamaan per tick
+        self.name_index_ttl = 60
+        self._name_index: Dict[int, tuple] = {}  # guild_id → (built_at, exact, entries)
+        self.track_cache_ttl = 8 * 86400  # > 1 minggu → reminder weekly tetap kena cache
+        self._track_cache: Dict[str, tuple] = {}  # query → (expires, raw track payload)
+        self._wake = asyncio.Event()
         self._task: Optional[asyncio.Task] = None
     
     async def start(self):
@@ -26,7 +42,7 @@ class ReminderScheduler:
             return
         self.running = True
         self._task = asyncio.create_task(self._run_loop())
-        log.info("⏰ Reminder scheduler started (interval: 30s)")
+        log.info("⏰ Reminder scheduler started (event-driven)")
     
     async def stop(self):
         """Stop the scheduler"""
@@ -39,33 +55,74 @@ class ReminderScheduler:
                 pass
         log.info("⏰ Reminder scheduler stopped")
     
+    def notify_new_reminder(self):
+        """Bangunkan loop — reminder baru bisa jatuh tempo lebih cepat dari jadwal tidur sekarang"""
+        self._wake.set()
+
+    def _next_delay(self) -> float:
+        next_ts = get_next_reminder_time()
+        if next_ts is None:
+            return self.max_sleep
+        # min 1s: reminder yang gagal diproses tidak boleh bikin loop spin
+        return min(max(1.0, next_ts - time.time()), self.max_sleep)
+
     async def _run_loop(self):
-        """Main scheduler loop"""
+        """Main scheduler loop: jalankan yang due, lalu tidur sampai reminder berikutnya"""
         await asyncio.sleep(5)  # Wait for bot to fully start
         while self.running:
+            # clear sebelum cek → notify di tengah-tengah tidak hilang
+            self._wake.clear()
+            delay = self.max_sleep
             try:
                 await self._check_and_execute()
+                delay = self._next_delay()
             except Exception as e:
                 log.error(f"⏰ Scheduler error: {e}")
-            await asyncio.sleep(self.check_interval)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
     
     async def _check_and_execute(self):
-        """Check for due reminders and execute them"""
-        from core.database import get_due_reminders, mark_reminder_triggered
-        
+        """Klaim reminder yang due (atomik), lalu eksekusi yang berhasil diklaim"""
         due_reminders = get_due_reminders()
+        if not due_reminders:
+            return
+        # Claim-then-process: state di DB maju dulu (reschedule / nonaktif) → instance scheduler lain
+        # tidak bisa menembak reminder yang sama, dan crash di tengah eksekusi tidak bikin refire
+        claimed = claim_due_reminders(due_reminders)
+        if len(claimed) < len(due_reminders):
+            log.info(f"⏰ {len(due_reminders) - len(claimed)} reminder(s) already claimed elsewhere")
+        sem = asyncio.Semaphore(self.max_concurrent)
         
-        for reminder in due_reminders:
-            try:
-                await self._execute_reminder(reminder)
-                is_recurring = reminder["trigger_type"] in ("daily", "weekly")
-                mark_reminder_triggered(reminder["id"], reschedule=is_recurring)
-                log.info(f"⏰ Reminder #{reminder['id']} executed: {reminder['message'][:30]}")
-            except Exception as e:
-                log.error(f"⏰ Failed to execute reminder #{reminder['id']}: {e}")
-                # Still mark as triggered to avoid infinite loop
-                mark_reminder_triggered(reminder["id"], reschedule=False)
+        async def _run_one(reminder):
+            async with sem:
+                try:
+                    await self._execute_reminder(reminder)
+                    log.info(f"⏰ Reminder #{reminder['id']} executed: {reminder['message'][:30]}")
+                except Exception as e:
+                    log.error(f"⏰ Failed to execute reminder #{reminder['id']}: {e}")
+        
+        # Paralel (dibatasi) → DM/musik yang lambat tidak menahan reminder lain
+        await asyncio.gather(*(_run_one(r) for r in claimed))
     
+    def _get_name_index(self, guild) -> tuple:
+        """(exact {lower name → member}, [(display_lower, name_lower, member)]) per guild, cache 60 detik.
+        Urutan sama dengan guild.members → member pertama yang cocok tetap menang"""
+        cached = self._name_index.get(guild.id)
+        now = time.monotonic()
+        if cached and now - cached[0] < self.name_index_ttl:
+            return cached[1], cached[2]
+        exact = {}
+        entries = []
+        for m in guild.members:
+            display, name = m.display_name.lower(), m.name.lower()
+            exact.setdefault(display, m)
+            exact.setdefault(name, m)
+            entries.append((display, name, m))
+        self._name_index[guild.id] = (now, exact, entries)
+        return exact, entries
+
     async def _execute_reminder(self, reminder: dict):
         """Execute all actions for a reminder"""
         guild = self.bot.get_guild(reminder["guild_id"])
@@ -85,17 +142,13 @@ class ReminderScheduler:
             target_user = guild.get_member(target_user_id)
         
         if not target_user and target_user_name:
-            # Search by display name
-            for m in guild.members:
-                if m.display_name.lower() == target_user_name.lower() or m.name.lower() == target_user_name.lower():
-                    target_user = m
-                    break
+            exact, entries = self._get_name_index(guild)
+            query = target_user_name.lower()
+            # Search by display name / username
+            target_user = exact.get(query)
             # Partial match
             if not target_user:
-                for m in guild.members:
-                    if target_user_name.lower() in m.display_name.lower() or target_user_name.lower() in m.name.lower():
-                        target_user = m
-                        break
+                target_user = next((m for display, name, m in entries if query in display or query in name), None)
         
         # Fallback to creator if no target specified
         if not target_user:
@@ -186,10 +239,7 @@ class ReminderScheduler:
     
     async def _execute_music_action(self, action: dict, guild, channel, user):
         """Execute music action"""
-        try:
-            import wavelink
-            from music.player import MusicPlayer, get_player, set_player
-        except ImportError:
+        if not MUSIC_AVAILABLE:
             log.error("⏰ Music module not available")
             return
         
@@ -220,14 +270,23 @@ class ReminderScheduler:
                     music_player = MusicPlayer(player)
                     set_player(guild.id, music_player)
             
-            # Search and play
-            tracks = await wavelink.Playable.search(query)
-            if tracks:
-                if isinstance(tracks, wavelink.Playlist):
-                    track = tracks.tracks[0]
-                else:
-                    track = tracks[0]
-                
+            # Search and play — recurring reminder pakai payload cache, skip search ke Lavalink
+            track = None
+            cached = self._track_cache.get(query)
+            if cached and cached[0] > time.monotonic():
+                track = wavelink.Playable(cached[1])
+            else:
+                tracks = await wavelink.Playable.search(query)
+                if tracks:
+                    if isinstance(tracks, wavelink.Playlist):
+                        track = tracks.tracks[0]
+                    else:
+                        track = tracks[0]
+                    now = time.monotonic()
+                    self._track_cache = {q: v for q, v in self._track_cache.items() if v[0] > now}
+                    self._track_cache[query] = (now + self.track_cache_ttl, track.raw_data)
+            
+            if track:
                 track.requester = user
                 
                 if not player.playing:
@@ -257,6 +316,11 @@ _scheduler: Optional[ReminderScheduler] = None
 def get_scheduler() -> Optional[ReminderScheduler]:
     return _scheduler
 
+def notify_new_reminder():
+    """Dipanggil setelah create_reminder() supaya scheduler re-plan jadwal tidurnya"""
+    if _scheduler is not None:
+        _scheduler.notify_new_reminder()
+
 def init_scheduler(bot) -> ReminderScheduler:
     global _scheduler
     _scheduler = ReminderScheduler(bot)
@@ -0,0 +1,118 @@
+"""
+Semantic Response Cache — paraphrase-tolerant tier on top of the exact cache
+Embeds the prompt (multilingual MiniLM via fastembed) and matches by cosine similarity.
+Opt-in via SEMANTIC_CACHE=true; also needs fastembed + numpy, otherwise disabled.
+"""
+import asyncio
+import logging
+import re
+from typing import List, Optional
+
+from config import SEMANTIC_CACHE
+
+try:
+    import numpy as np
+    from fastembed import TextEmbedding
+except ImportError:
+    np = None
+    TextEmbedding = None
+
+log = logging.getLogger(__name__)
+
+EMBED_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+SIMILARITY_THRESHOLD = 0.92
+MAX_ENTRIES = 10_000
+
+_DIGITS = re.compile(r"\d+(?:[.,]\d+)*")
+_ENTITY = re.compile(r"(?<![.!?]\s)(?<!^)\b[A-Z][\w'-]*|[@#][\w-]+")
+
+
+def _signature(text: str) -> tuple:
+    """Angka + nama (kata kapital di tengah kalimat, @mention, #channel) — harus sama persis"""
+    return (
+        frozenset(_DIGITS.findall(text)),
+        frozenset(e.lower() for e in _ENTITY.findall(text.strip())),
+    )
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD,
+                 max_entries: int = MAX_ENTRIES, allow_cross_model: bool = False,
+                 opt_in: bool = False):
+        self.opt_in = opt_in
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.allow_cross_model = allow_cross_model
+        self._model = None
+        self._matrix = None            # (N, D) float32, rows L2-normalized
+        self._routes: List[tuple] = []  # (mode, provider, model) per row
+        self._texts: List[str] = []
+        self._sigs: List[tuple] = []     # _signature(prompt) per row
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.opt_in and TextEmbedding is not None
+
+    def _embed(self, text: str):
+        if self._model is None:
+            log.info(f"🧠 Loading semantic cache model: {EMBED_MODEL}")
+            self._model = TextEmbedding(EMBED_MODEL)
+        v = np.asarray(next(iter(self._model.embed([text]))), dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    async def get(self, route: tuple, text: str) -> Optional[str]:
+        if not self.enabled or self._matrix is None:
+            return None
+        async with self._lock:
+            try:
+                q = await asyncio.to_thread(self._embed, text)
+            except Exception as e:
+                log.warning(f"Semantic cache embed error: {e}")
+                return None
+            scores = self._matrix @ q
+            sig = _signature(text)
+            for idx in np.argsort(scores)[::-1]:
+                if scores[idx] < self.threshold:
+                    break
+                # "jam 7" vs "jam 8", "Budi" vs "Andi" → embedding mirip, jawaban beda
+                if self._sigs[idx] != sig:
+                    continue
+                if self.allow_cross_model or self._routes[idx] == route:
+                    return self._texts[idx]
+        return None
+
+    async def put(self, route: tuple, text: str, response: str):
+        if not self.enabled or not response:
+            return
+        async with self._lock:
+            try:
+                v = await asyncio.to_thread(self._embed, text)
+            except Exception as e:
+                log.warning(f"Semantic cache embed error: {e}")
+                return
+            if self._matrix is None:
+                self._matrix = v[None, :]
+            else:
+                self._matrix = np.vstack((self._matrix, v))
+            self._routes.append(route)
+            self._texts.append(response)
+            self._sigs.append(_signature(text))
+
+            # Evict oldest 10% sekaligus supaya tidak copy matrix tiap insert
+            if len(self._texts) > self.max_entries:
+                drop = max(1, self.max_entries // 10)
+                self._matrix = self._matrix[drop:]
+                del self._routes[:drop]
+                del self._texts[:drop]
+                del self._sigs[:drop]
+
+    def clear(self):
+        self._matrix = None
+        self._routes.clear()
+        self._texts.clear()
+        self._sigs.clear()
+
+
+semantic_cache = SemanticCache(opt_in=SEMANTIC_CACHE)
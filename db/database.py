@@ -4,14 +4,28 @@ Handles persistent storage and caching
 """
 
 import asyncio
+import copy
 import json
 import logging
+import time
+import uuid
 from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
+from datetime import timedelta
 from dataclasses import dataclass, asdict
 
 log = logging.getLogger(__name__)
 
+GUILD_INVALIDATE_CHANNEL = "guild:invalidate"
+GUILD_L1_TTL = 30  # detik
+
+LOG_FLUSH_INTERVAL = 2.0  # detik
+LOG_FLUSH_SIZE = 200
+LOG_BUFFER_MAX = 10_000  # batas saat PostgreSQL lagi down — log tertua dibuang
+_LOG_COLUMNS = [
+    "guild_id", "user_id", "provider", "model", "mode",
+    "success", "latency", "tokens_used", "error",
+]
+
 # ============================================================
 # DATA MODELS
 # ============================================================
@@ -67,6 +81,8 @@ class RedisCache:
     def __init__(self, redis_url: str):
         self.redis_url = redis_url
         self.redis = None
+        self._rate_script = None
+        self.instance_id = uuid.uuid4().hex  # tag pesan invalidasi → pesan sendiri di-skip
     
     async def connect(self):
         """Connect to Redis"""
@@ -74,6 +90,12 @@ class RedisCache:
             import redis.asyncio as redis
             self.redis = redis.from_url(self.redis_url, decode_responses=True)
             await self.redis.ping()
+            # INCR + EXPIRE (hanya saat key baru) di server → satu round-trip per cek
+            self._rate_script = self.redis.register_script(
+                "local n = redis.call('INCR', KEYS[1]) "
+                "if n == 1 then redis.call('EXPIRE', KEYS[1], ARGV[1]) end "
+                "return n"
+            )
             log.info("Redis connected")
             return True
         except Exception as e:
@@ -114,15 +136,18 @@ class RedisCache:
     
     # ----- Rate Limits -----
     
+    @staticmethod
+    def _rate_key(provider: str, window: int) -> str:
+        # time.time() langsung — tanpa alokasi datetime per cek
+        return f"rate:{provider}:{int(time.time()) // window}"
+    
     async def increment_rate(self, provider: str, window: int = 60) -> int:
         """Increment rate counter, return current count"""
         if not self.redis:
             return 0
         try:
-            key = f"rate:{provider}:{int(datetime.now().timestamp()) // window}"
-            count = await self.redis.incr(key)
-            await self.redis.expire(key, window * 2)
-            return count
+            key = self._rate_key(provider, window)
+            return int(await self._rate_script(keys=[key], args=[window * 2]))
         except Exception as e:
             log.error(f"Redis rate error: {e}")
             return 0
@@ -132,7 +157,7 @@ class RedisCache:
         if not self.redis:
             return 0
         try:
-            key = f"rate:{provider}:{int(datetime.now().timestamp()) // window}"
+            key = self._rate_key(provider, window)
             value = await self.redis.get(key)
             return int(value) if value else 0
         except Exception as e:
@@ -175,6 +200,36 @@ class RedisCache:
         except Exception as e:
             log.error(f"Redis invalidate error: {e}")
 
+    async def publish_guild_invalidate(self, guild_id: int):
+        """Broadcast ke proses lain supaya L1 cache mereka di-drop"""
+        if not self.redis:
+            return
+        try:
+            await self.redis.publish(GUILD_INVALIDATE_CHANNEL, f"{self.instance_id}:{guild_id}")
+        except Exception as e:
+            log.error(f"Redis publish error: {e}")
+
+    async def listen_guild_invalidate(self, on_invalidate):
+        """Subscribe channel invalidasi, panggil on_invalidate(guild_id) tiap pesan dari proses lain"""
+        if not self.redis:
+            return
+        try:
+            pubsub = self.redis.pubsub()
+            await pubsub.subscribe(GUILD_INVALIDATE_CHANNEL)
+            async for msg in pubsub.listen():
+                if msg.get("type") == "message":
+                    sender, _, gid = str(msg["data"]).rpartition(":")
+                    if sender == self.instance_id:
+                        continue  # L1 proses ini sudah di-update langsung oleh save_guild_settings
+                    try:
+                        on_invalidate(int(gid))
+                    except ValueError:
+                        pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error(f"Redis subscribe error: {e}")
+
 # ============================================================
 # POSTGRESQL DATABASE
 # ============================================================
@@ -260,10 +315,11 @@ class PostgresDB:
         
         try:
             async with self.pool.acquire() as conn:
-                row = await conn.fetchrow(
-                    "SELECT * FROM guild_settings WHERE guild_id = $1",
-                    guild_id
-                )
+                row = await conn.fetchrow("""
+                    SELECT guild_id, provider, model, mode, auto_chat,
+                           auto_detect, search_engine, enabled_channels
+                    FROM guild_settings WHERE guild_id = $1
+                """, guild_id)
                 
                 if row:
                     return GuildSettings(
@@ -320,28 +376,30 @@ class PostgresDB:
     
     async def log_request(self, log_entry: RequestLog):
         """Log AI request to database"""
+        await self.log_requests([log_entry])
+    
+    async def log_requests(self, entries: List[RequestLog]) -> bool:
+        """Tulis banyak log sekaligus via COPY — satu round-trip per batch. False kalau gagal"""
         if not self.pool:
-            return
+            return False
+        if not entries:
+            return True
         
         try:
             async with self.pool.acquire() as conn:
-                await conn.execute("""
-                    INSERT INTO request_logs 
-                    (guild_id, user_id, provider, model, mode, success, latency, tokens_used, error)
-                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-                """,
-                    log_entry.guild_id,
-                    log_entry.user_id,
-                    log_entry.provider,
-                    log_entry.model,
-                    log_entry.mode,
-                    log_entry.success,
-                    log_entry.latency,
-                    log_entry.tokens_used,
-                    log_entry.error
+                await conn.copy_records_to_table(
+                    "request_logs",
+                    records=[
+                        (e.guild_id, e.user_id, e.provider, e.model, e.mode,
+                         e.success, e.latency, e.tokens_used, e.error)
+                        for e in entries
+                    ],
+                    columns=_LOG_COLUMNS,
                 )
+            return True
         except Exception as e:
             log.error(f"Log request error: {e}")
+            return False
     
     async def get_recent_logs(self, guild_id: int, limit: int = 10) -> List[Dict]:
         """Get recent logs for guild"""
@@ -351,7 +409,9 @@ class PostgresDB:
         try:
             async with self.pool.acquire() as conn:
                 rows = await conn.fetch("""
-                    SELECT * FROM request_logs 
+                    SELECT id, timestamp, provider, model, mode,
+                           success, latency, tokens_used, error
+                    FROM request_logs 
                     WHERE guild_id = $1 
                     ORDER BY timestamp DESC 
                     LIMIT $2
@@ -390,8 +450,8 @@ class PostgresDB:
                         SUM(tokens_used) as total_tokens
                     FROM request_logs 
                     WHERE guild_id = $1 
-                    AND timestamp > NOW() - INTERVAL '%s hours'
-                """ % hours, guild_id)
+                    AND timestamp > NOW() - make_interval(hours => $2)
+                """, guild_id, int(hours))
                 
                 if row:
                     total = row["total"] or 0
@@ -418,11 +478,24 @@ class DatabaseManager:
         self.postgres = PostgresDB(database_url)
         self.redis = RedisCache(redis_url)
         self._memory_cache: Dict[int, Dict] = {}  # Fallback in-memory cache
+        self._l1: Dict[int, tuple] = {}  # guild_id -> (monotonic ts, settings), di depan Redis
+        self._invalidate_task: Optional[asyncio.Task] = None
+        # Buffer request log, di-flush background tiap LOG_FLUSH_INTERVAL / LOG_FLUSH_SIZE
+        self._log_buf: List[RequestLog] = []
+        self._log_lock = asyncio.Lock()
+        self._log_event = asyncio.Event()
+        self._log_task: Optional[asyncio.Task] = None
     
     async def connect(self):
         """Connect to all databases"""
         pg_ok = await self.postgres.connect()
         redis_ok = await self.redis.connect()
+        if pg_ok:
+            self._log_task = asyncio.create_task(self._log_flusher())
+        if redis_ok:
+            self._invalidate_task = asyncio.create_task(
+                self.redis.listen_guild_invalidate(lambda gid: self._l1.pop(gid, None))
+            )
         
         if not pg_ok:
             log.warning("Running without PostgreSQL - using in-memory storage")
@@ -433,15 +506,31 @@ class DatabaseManager:
     
     async def close(self):
         """Close all connections"""
+        if self._invalidate_task:
+            self._invalidate_task.cancel()
+        if self._log_task:
+            self._log_task.cancel()
+            # Tunggu flush yang sedang jalan selesai di-cancel (rows-nya balik ke buffer) sebelum flush terakhir
+            try:
+                await self._log_task
+            except asyncio.CancelledError:
+                pass
+        await self._flush_logs()
         await self.postgres.close()
         await self.redis.close()
     
     async def get_guild_settings(self, guild_id: int) -> Dict:
         """Get guild settings with caching"""
         
-        # Try Redis cache first
+        # L1 in-process dulu — tanpa round-trip Redis
+        hit = self._l1.get(guild_id)
+        if hit and time.monotonic() - hit[0] < GUILD_L1_TTL:
+            return copy.deepcopy(hit[1])  # caller boleh mutate (termasuk list di dalamnya)
+        
+        # Try Redis cache
         cached = await self.redis.get_cached_guild_settings(guild_id)
         if cached:
+            self._l1[guild_id] = (time.monotonic(), copy.deepcopy(cached))
             return cached
         
         # Try PostgreSQL
@@ -449,6 +538,7 @@ class DatabaseManager:
         if settings:
             data = settings.to_dict()
             await self.redis.cache_guild_settings(guild_id, data)
+            self._l1[guild_id] = (time.monotonic(), copy.deepcopy(data))
             return data
         
         # Try memory cache
@@ -475,6 +565,7 @@ class DatabaseManager:
         
         # Update memory cache
         self._memory_cache[guild_id] = settings
+        self._l1[guild_id] = (time.monotonic(), copy.deepcopy(settings))
         
         # Invalidate Redis cache
         await self.redis.invalidate_guild_cache(guild_id)
@@ -485,6 +576,7 @@ class DatabaseManager:
         
         # Update Redis cache
         await self.redis.cache_guild_settings(guild_id, settings)
+        await self.redis.publish_guild_invalidate(guild_id)
     
     async def log_request(
         self,
@@ -510,11 +602,42 @@ class DatabaseManager:
             tokens_used=tokens_used,
             error=error
         )
-        await self.postgres.log_request(log_entry)
+        if self.postgres.pool:
+            self._log_buf.append(log_entry)
+            if len(self._log_buf) >= LOG_FLUSH_SIZE:
+                self._log_event.set()
         
         # Update rate counter in Redis
         await self.redis.increment_rate(provider)
     
+    async def _flush_logs(self):
+        """Swap buffer lalu tulis ke PostgreSQL dalam satu COPY"""
+        async with self._log_lock:
+            if not self._log_buf:
+                return
+            rows, self._log_buf = self._log_buf, []
+            ok = False
+            try:
+                ok = await self.postgres.log_requests(rows)
+            finally:
+                # COPY gagal / di-cancel → kembalikan ke depan buffer, dicoba lagi flush berikutnya
+                if not ok:
+                    self._log_buf[:0] = rows
+                    overflow = len(self._log_buf) - LOG_BUFFER_MAX
+                    if overflow > 0:
+                        del self._log_buf[:overflow]
+                        log.warning(f"Request log buffer full, dropped {overflow} oldest entries")
+    
+    async def _log_flusher(self):
+        """Background task: flush saat buffer penuh atau tiap LOG_FLUSH_INTERVAL"""
+        while True:
+            try:
+                await asyncio.wait_for(self._log_event.wait(), timeout=LOG_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._log_event.clear()
+            await self._flush_logs()
+    
     async def get_recent_logs(self, guild_id: int, limit: int = 10) -> List[Dict]:
         """Get recent logs"""
         return await self.postgres.get_recent_logs(guild_id, limit)
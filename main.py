@@ -13,6 +13,7 @@ from discord.ext import commands
 import wavelink
 import asyncio
 import logging
+import time
 from datetime import datetime, timedelta
 from skills.tts_skill import generate_tts, cleanup_old_tts, parse_speed, VOICES, VOICE_ALIASES, SPEED_PRESETS
 
@@ -98,6 +99,8 @@ from core.database import (
     get_user_location,
     delete_user_location
 )
+from core.providers import get_session
+from core.scheduler import notify_new_reminder
 
 logging.basicConfig(
     level=logging.INFO,
@@ -205,19 +208,19 @@ def get_active_profile(guild_id: int) -> dict:
 async def geocode_location(location: str) -> tuple:
     """Get lat/lon from location name using free Nominatim API"""
     try:
-        async with aiohttp.ClientSession() as session:
-            url = "https://nominatim.openstreetmap.org/search"
-            params = {"q": location, "format": "json", "limit": 1}
-            headers = {"User-Agent": "DiscordBot/1.0"}
-
-            async with session.get(
-                url, params=params, headers=headers,
-                timeout=aiohttp.ClientTimeout(total=10)
-            ) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    if data:
-                        return float(data[0]["lat"]), float(data[0]["lon"])
+        session = await get_session()
+        url = "https://nominatim.openstreetmap.org/search"
+        params = {"q": location, "format": "json", "limit": 1}
+        headers = {"User-Agent": "DiscordBot/1.0"}
+
+        async with session.get(
+            url, params=params, headers=headers,
+            timeout=aiohttp.ClientTimeout(total=10)
+        ) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                if data:
+                    return float(data[0]["lat"]), float(data[0]["lon"])
     except Exception as e:
         log.warning(f"Geocoding failed for '{location}': {e}")
 
@@ -448,21 +451,21 @@ async def execute_image_action(message: discord.Message, action: dict):
     image_url = action.get("image_url", "")
     if not image_url: return
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(image_url, timeout=aiohttp.ClientTimeout(total=60)) as resp:
-                if resp.status == 200:
-                    image_data = await resp.read()
-                    temp_dir = tempfile.mkdtemp()
-                    temp_path = os.path.join(temp_dir, "generated.png")
-                    with open(temp_path, "wb") as f: f.write(image_data)
-                    discord_file = discord.File(temp_path, filename="generated.png")
-                    await message.channel.send(file=discord_file)
-                    os.unlink(temp_path)
-                    os.rmdir(temp_dir)
-                else:
-                    embed = discord.Embed(color=0x1DB954)
-                    embed.set_image(url=image_url)
-                    await message.channel.send(embed=embed)
+        session = await get_session()
+        async with session.get(image_url, timeout=aiohttp.ClientTimeout(total=60)) as resp:
+            if resp.status == 200:
+                image_data = await resp.read()
+                temp_dir = tempfile.mkdtemp()
+                temp_path = os.path.join(temp_dir, "generated.png")
+                with open(temp_path, "wb") as f: f.write(image_data)
+                discord_file = discord.File(temp_path, filename="generated.png")
+                await message.channel.send(file=discord_file)
+                os.unlink(temp_path)
+                os.rmdir(temp_dir)
+            else:
+                embed = discord.Embed(color=0x1DB954)
+                embed.set_image(url=image_url)
+                await message.channel.send(embed=embed)
     except Exception as e:
         log.error(f"🖼️ Image error: {e}")
         embed = discord.Embed(color=0x1DB954)
@@ -517,6 +520,7 @@ async def execute_reminder_action(message: discord.Message, action: dict):
                 trigger_minutes=int(minutes), timezone=timezone,
                 actions=[{"type": "channel_message"}]
             )
+            notify_new_reminder()
             await message.channel.send(
                 f"⏰ Reminder tersimpan! ID: **#{reminder_id}**\n"
                 f"Trigger dalam **{minutes} menit**\n💾 Persistent"
@@ -530,6 +534,7 @@ async def execute_reminder_action(message: discord.Message, action: dict):
                 trigger_time=daily_time, timezone=timezone,
                 actions=[{"type": "channel_message"}]
             )
+            notify_new_reminder()
             recur_text = "harian" if recurring else "sekali"
             await message.channel.send(
                 f"⏰ Reminder tersimpan! ID: **#{reminder_id}**\n"
@@ -1037,6 +1042,7 @@ async def on_message(message: discord.Message):
         settings["_user_lon"] = None
 
     # Call AI handler
+    stream_reply = _StreamingReply(message)
     async with message.channel.typing():
         from core.handler import handle_message
         settings["guild_id"] = message.guild.id
@@ -1044,7 +1050,8 @@ async def on_message(message: discord.Message):
             content, settings,
             channel_id=message.channel.id,
             user_id=message.author.id,
-            user_name=message.author.display_name
+            user_name=message.author.display_name,
+            on_partial=stream_reply.on_partial
         )
 
         response_text = result["text"]
@@ -1053,12 +1060,13 @@ async def on_message(message: discord.Message):
         response_text += f"\n\n-# {fallback_note}"
 
     # ── Send text response ──
-    if len(response_text) > 2000:
-        chunks = _split_message(response_text)
-        for chunk in chunks:
-            await message.reply(chunk, mention_author=False)
-    else:
-        await message.reply(response_text, mention_author=False)
+    chunks = _split_message(response_text) if len(response_text) > 2000 else [response_text]
+    if stream_reply.sent:
+        # Pesan streaming sudah ada → finalize dengan teks lengkap
+        await stream_reply.finish(chunks[0])
+        chunks = chunks[1:]
+    for chunk in chunks:
+        await message.reply(chunk, mention_author=False)
 
     # ── Auto TTS ──
     voice_cfg = settings.get("voice", {})
@@ -1096,6 +1104,54 @@ async def on_message(message: discord.Message):
         except Exception as e:
             log.error(f"🔧 Action error [{action.get('type')}]: {e}")
 
+# ============================================================
+# STREAMING REPLY — progressive edit while the AI streams
+# ============================================================
+
+class _StreamingReply:
+    """Kirim satu reply lalu edit berkala selama respons AI masih streaming"""
+
+    EDIT_INTERVAL = 1.5  # detik — jaga di bawah rate limit edit Discord
+
+    def __init__(self, message: discord.Message):
+        from core.handler import ThinkStripper
+        self.message = message
+        self.sent = None
+        self._last_edit = 0.0
+        self._stripper = ThinkStripper()
+        self._visible = ""
+        self._consumed = 0
+
+    async def on_partial(self, text: str):
+        if len(text) < self._consumed:
+            # Provider fallback mulai ulang dari awal
+            self._stripper.flush()
+            self._visible, self._consumed = "", 0
+        self._visible += self._stripper.feed(text[self._consumed:])
+        self._consumed = len(text)
+
+        now = time.monotonic()
+        if now - self._last_edit < self.EDIT_INTERVAL:
+            return
+        self._last_edit = now
+        preview = self._visible.strip()[:1990]
+        if not preview:
+            return
+        try:
+            if self.sent is None:
+                self.sent = await self.message.reply(preview + " ▌", mention_author=False)
+            else:
+                await self.sent.edit(content=preview + " ▌")
+        except discord.HTTPException as e:
+            log.debug(f"Streaming edit error: {e}")
+
+    async def finish(self, text: str):
+        try:
+            await self.sent.edit(content=text)
+        except discord.HTTPException:
+            await self.message.reply(text, mention_author=False)
+
+
 # ============================================================
 # AUTO TTS — Speak AI response in voice channel
 # ============================================================
@@ -1392,13 +1448,19 @@ async def status_cmd(ctx):
 @bot.command(name="monitor")
 @commands.has_permissions(manage_guild=True)
 async def monitor_cmd(ctx):
+    from core.handler import breaker_state
     available = list_available_providers()
     lines = ["**📊 Provider Health**\n"]
     for name, provider in PROVIDERS.items():
         icon = PROVIDER_ICONS.get(name, "📦")
         status = "🟢" if name in available else "⚪"
+        breaker = breaker_state(name)
+        if breaker == "open":
+            status = "🔴"
+        elif breaker == "half_open":
+            status = "🟡"
         lines.append(f"{status} {icon} **{provider.name}** • `{provider.rate_limit}`")
-    lines.append(f"\n🟢 Available  ⚪ No API Key")
+    lines.append(f"\n🟢 Available  ⚪ No API Key  🔴 Circuit open  🟡 Probing")
     embed = discord.Embed(description="\n".join(lines), color=discord.Color.blue())
     await ctx.send(embed=embed)
 
@@ -1866,8 +1928,21 @@ if __name__ == "__main__":
     log.info("Starting bot...")
 
     async def run_bot():
-        async with bot:
-            bot.loop.create_task(self_ping())
-            await bot.start(DISCORD_TOKEN)
+        from core.providers import close_session
+        try:
+            async with bot:
+                bot.loop.create_task(self_ping())
+                await bot.start(DISCORD_TOKEN)
+        finally:
+            await close_session()
+
+    # uvloop harus terpasang sebelum asyncio.run; session aiohttp dibuat lazy di dalam loop.
+    # Windows tidak punya uvloop → tetap pakai default ProactorEventLoop
+    try:
+        import uvloop
+        uvloop.install()
+        log.info("⚡ uvloop event loop enabled")
+    except ImportError:
+        pass
 
     asyncio.run(run_bot())
@@ -29,7 +29,7 @@ async def fetch_lyrics(title: str, artist: str = None, duration_ms: int = 0, tra
         import syncedlyrics
         q = f"{clean_title(title)} {clean_artist(artist)}" if artist else clean_title(title)
         log.info(f"Searching lyrics: {q}")
-        result = await asyncio.get_event_loop().run_in_executor(None, lambda: syncedlyrics.search(q))
+        result = await asyncio.get_running_loop().run_in_executor(None, lambda: syncedlyrics.search(q))
         if result:
             result = re.sub(r'\[\d{2}:\d{2}\.\d{2,3}\]\s*', '', result)
             return clean_lyrics_text(result)
@@ -56,11 +56,13 @@ async def self_ping():
     await asyncio.sleep(30)
     log.info(f"🏓 Self-ping enabled: {health_url} (every 5 min)")
 
-    async with aiohttp.ClientSession() as session:
-        while True:
-            try:
-                async with session.get(health_url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                    log.info(f"🏓 Self-ping: {resp.status}")
-            except Exception as e:
-                log.warning(f"🏓 Self-ping error: {e}")
-            await asyncio.sleep(300)
+    from core.providers import get_session
+
+    while True:
+        try:
+            session = await get_session()
+            async with session.get(health_url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+                log.info(f"🏓 Self-ping: {resp.status}")
+        except Exception as e:
+            log.warning(f"🏓 Self-ping error: {e}")
+        await asyncio.sleep(300)
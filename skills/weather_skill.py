@@ -7,6 +7,7 @@ import aiohttp
 import asyncio
 import logging
 from typing import Dict, Optional
+from core.providers import get_session
 
 log = logging.getLogger(__name__)
 
@@ -48,17 +49,17 @@ async def get_coordinates(city: str, owm_api_key: Optional[str] = None) -> Optio
     if owm_api_key:
         try:
             url = f"http://api.openweathermap.org/geo/1.0/direct?q={city}&limit=1&appid={owm_api_key}"
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        if data:
-                            return {
-                                "lat": data[0]["lat"],
-                                "lon": data[0]["lon"],
-                                "name": data[0].get("local_names", {}).get("id") or data[0]["name"],
-                                "country": data[0].get("country", "")
-                            }
+            session = await get_session()
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+                if resp.status == 200:
+                    data = await resp.json()
+                    if data:
+                        return {
+                            "lat": data[0]["lat"],
+                            "lon": data[0]["lon"],
+                            "name": data[0].get("local_names", {}).get("id") or data[0]["name"],
+                            "country": data[0].get("country", "")
+                        }
         except Exception as e:
             log.warning(f"OWM Geocoding error: {e}")
     
@@ -66,17 +67,17 @@ async def get_coordinates(city: str, owm_api_key: Optional[str] = None) -> Optio
     try:
         url = f"https://nominatim.openstreetmap.org/search?q={city}&format=json&limit=1"
         headers = {"User-Agent": "DiscordWeatherBot/1.0"}
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    if data:
-                        return {
-                            "lat": float(data[0]["lat"]),
-                            "lon": float(data[0]["lon"]),
-                            "name": data[0]["display_name"].split(",")[0],
-                            "country": ""
-                        }
+        session = await get_session()
+        async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                if data:
+                    return {
+                        "lat": float(data[0]["lat"]),
+                        "lon": float(data[0]["lon"]),
+                        "name": data[0]["display_name"].split(",")[0],
+                        "country": ""
+                    }
     except Exception as e:
         log.warning(f"Nominatim Geocoding error: {e}")
     
@@ -94,30 +95,30 @@ async def get_weather_open_meteo(lat: float, lon: float, city_name: str) -> Dict
             f"&timezone=auto"
         )
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    current = data.get("current", {})
+        session = await get_session()
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                current = data.get("current", {})
                     
-                    weather_code = current.get("weather_code", 0)
-                    description = WMO_CODES.get(weather_code, "Unknown")
+                weather_code = current.get("weather_code", 0)
+                description = WMO_CODES.get(weather_code, "Unknown")
                     
-                    return {
-                        "success": True,
-                        "source": "Open-Meteo",
-                        "city": city_name,
-                        "temp": round(current.get("temperature_2m", 0)),
-                        "feels_like": round(current.get("apparent_temperature", 0)),
-                        "humidity": current.get("relative_humidity_2m", 0),
-                        "description": description,
-                        "wind_speed": round(current.get("wind_speed_10m", 0)),
-                        "wind_direction": current.get("wind_direction_10m", 0),
-                        "pressure": current.get("pressure_msl", 0),
-                        "weather_code": weather_code,
-                    }
-                else:
-                    return {"success": False, "error": f"Open-Meteo HTTP {resp.status}"}
+                return {
+                    "success": True,
+                    "source": "Open-Meteo",
+                    "city": city_name,
+                    "temp": round(current.get("temperature_2m", 0)),
+                    "feels_like": round(current.get("apparent_temperature", 0)),
+                    "humidity": current.get("relative_humidity_2m", 0),
+                    "description": description,
+                    "wind_speed": round(current.get("wind_speed_10m", 0)),
+                    "wind_direction": current.get("wind_direction_10m", 0),
+                    "pressure": current.get("pressure_msl", 0),
+                    "weather_code": weather_code,
+                }
+            else:
+                return {"success": False, "error": f"Open-Meteo HTTP {resp.status}"}
     except Exception as e:
         return {"success": False, "error": f"Open-Meteo error: {e}"}
 
@@ -127,30 +128,30 @@ async def get_weather_openweathermap(city: str, api_key: str) -> Dict:
     try:
         url = f"https://api.openweathermap.org/data/2.5/weather?q={city}&appid={api_key}&units=metric&lang=id"
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
+        session = await get_session()
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+            if resp.status == 200:
+                data = await resp.json()
                     
-                    return {
-                        "success": True,
-                        "source": "OpenWeatherMap",
-                        "city": data.get("name", city),
-                        "temp": round(data["main"]["temp"]),
-                        "feels_like": round(data["main"]["feels_like"]),
-                        "humidity": data["main"]["humidity"],
-                        "description": data["weather"][0]["description"].title(),
-                        "wind_speed": round(data["wind"]["speed"] * 3.6),  # m/s to km/h
-                        "wind_direction": data["wind"].get("deg", 0),
-                        "pressure": data["main"]["pressure"],
-                        "visibility": data.get("visibility", 0) / 1000,  # m to km
-                        "icon": data["weather"][0]["icon"],
-                        "country": data["sys"].get("country", ""),
-                    }
-                elif resp.status == 404:
-                    return {"success": False, "error": f"Kota tidak ditemukan: {city}"}
-                else:
-                    return {"success": False, "error": f"OpenWeatherMap HTTP {resp.status}"}
+                return {
+                    "success": True,
+                    "source": "OpenWeatherMap",
+                    "city": data.get("name", city),
+                    "temp": round(data["main"]["temp"]),
+                    "feels_like": round(data["main"]["feels_like"]),
+                    "humidity": data["main"]["humidity"],
+                    "description": data["weather"][0]["description"].title(),
+                    "wind_speed": round(data["wind"]["speed"] * 3.6),  # m/s to km/h
+                    "wind_direction": data["wind"].get("deg", 0),
+                    "pressure": data["main"]["pressure"],
+                    "visibility": data.get("visibility", 0) / 1000,  # m to km
+                    "icon": data["weather"][0]["icon"],
+                    "country": data["sys"].get("country", ""),
+                }
+            elif resp.status == 404:
+                return {"success": False, "error": f"Kota tidak ditemukan: {city}"}
+            else:
+                return {"success": False, "error": f"OpenWeatherMap HTTP {resp.status}"}
     except Exception as e:
         return {"success": False, "error": f"OpenWeatherMap error: {e}"}
 
@@ -229,32 +230,32 @@ async def get_forecast(city: str, days: int = 3, api_key: Optional[str] = None)
             f"&timezone=auto&forecast_days={days}"
         )
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    daily = data.get("daily", {})
+        session = await get_session()
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                daily = data.get("daily", {})
                     
-                    forecasts = []
-                    dates = daily.get("time", [])
+                forecasts = []
+                dates = daily.get("time", [])
                     
-                    for i, date in enumerate(dates):
-                        weather_code = daily["weather_code"][i]
-                        forecasts.append({
-                            "date": date,
-                            "description": WMO_CODES.get(weather_code, "Unknown"),
-                            "temp_max": round(daily["temperature_2m_max"][i]),
-                            "temp_min": round(daily["temperature_2m_min"][i]),
-                            "rain_chance": daily["precipitation_probability_max"][i],
-                            "wind_max": round(daily["wind_speed_10m_max"][i]),
-                        })
+                for i, date in enumerate(dates):
+                    weather_code = daily["weather_code"][i]
+                    forecasts.append({
+                        "date": date,
+                        "description": WMO_CODES.get(weather_code, "Unknown"),
+                        "temp_max": round(daily["temperature_2m_max"][i]),
+                        "temp_min": round(daily["temperature_2m_min"][i]),
+                        "rain_chance": daily["precipitation_probability_max"][i],
+                        "wind_max": round(daily["wind_speed_10m_max"][i]),
+                    })
                     
-                    return {
-                        "success": True,
-                        "city": coords["name"],
-                        "forecasts": forecasts,
-                    }
-                else:
-                    return {"success": False, "error": f"Forecast HTTP {resp.status}"}
+                return {
+                    "success": True,
+                    "city": coords["name"],
+                    "forecasts": forecasts,
+                }
+            else:
+                return {"success": False, "error": f"Forecast HTTP {resp.status}"}
     except Exception as e:
         return {"success": False, "error": f"Forecast error: {e}"}
@@ -0,0 +1,55 @@
+"""claim_due_reminders: satu reminder hanya bisa diklaim sekali"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from core import database
+
+
+class ReminderClaimTest(unittest.TestCase):
+    def setUp(self):
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        for p in (mock.patch.object(database, "DB_PATH", path),
+                  mock.patch.object(database, "USE_TURSO", False)):
+            p.start()
+            self.addCleanup(p.stop)
+        database.init_reminders_table()
+        conn = database._get_conn()
+        rows = [
+            (1, "once", None, "2020-01-01T08:00:00"),
+            (2, "daily", "08:00", "2020-01-01T08:00:00"),
+            (3, "daily", "08:00:00", "2020-01-01T08:00:00"),  # trigger_time rusak
+        ]
+        conn.executemany(
+            "INSERT INTO reminders (id, guild_id, channel_id, user_id, message, trigger_type, "
+            "trigger_time, next_trigger) VALUES (?, 1, 1, 1, 'm', ?, ?, ?)", rows)
+        conn.commit()
+        conn.close()
+
+    def _row(self, rid):
+        conn = database._get_conn()
+        row = conn.execute("SELECT is_active, next_trigger FROM reminders WHERE id = ?", (rid,)).fetchone()
+        conn.close()
+        return row
+
+    def test_second_scheduler_cannot_claim(self):
+        due_a = database.get_due_reminders()
+        due_b = database.get_due_reminders()  # instance lain membaca snapshot yang sama
+        self.assertEqual(len(due_a), 3)
+
+        claimed = database.claim_due_reminders(due_a)
+        self.assertEqual(sorted(r["id"] for r in claimed), [1, 2, 3])
+        self.assertEqual(database.claim_due_reminders(due_b), [])
+
+        self.assertEqual(self._row(1)[0], 0)                       # once → nonaktif
+        self.assertEqual(self._row(2)[0], 1)                       # daily → dijadwalkan ulang
+        self.assertNotEqual(self._row(2)[1], "2020-01-01T08:00:00")
+        self.assertEqual(self._row(3)[0], 0)                       # row rusak → nonaktif, batch tetap jalan
+        self.assertEqual(database.get_due_reminders(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
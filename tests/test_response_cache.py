@@ -0,0 +1,65 @@
+"""Response cache di handle_message: pertanyaan yang sama di turn berikutnya harus hit"""
+import unittest
+from unittest import mock
+
+from core import handler
+from core.providers import AIResponse
+
+
+class ResponseCacheTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        handler._RESP_CACHE.clear()
+        self.history = []
+        self.calls = 0
+
+        def save_message(guild_id, channel_id, user_id, user_name, role, content):
+            self.history.append({"role": role, "content": content, "user_name": user_name})
+
+        async def execute_with_fallback(msgs, mode, prov, mid, guild_id, on_partial=None):
+            self.calls += 1
+            return AIResponse(True, "Mitosis menghasilkan 2 sel, meiosis 4 sel.", prov, mid), None
+
+        async def no_skill(content):
+            return None
+
+        plan = handler.RoutingPlan("huggingface", "test-model", "duckduckgo", False)
+        patches = [
+            mock.patch.object(handler, "get_conversation", lambda *a, **k: list(self.history)),
+            mock.patch.object(handler, "save_message", save_message),
+            mock.patch.object(handler, "execute_with_fallback", execute_with_fallback),
+            mock.patch.object(handler, "get_routing_plan", lambda settings, mode: plan),
+            mock.patch("skills.detector.SkillDetector.detect_and_execute", no_skill),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    async def _ask(self, content, user_id=7, channel_id=1):
+        return await handler.handle_message(content, {"guild_id": 1}, channel_id=channel_id,
+                                            user_id=user_id, user_name="Budi")
+
+    async def test_same_question_next_turn_hits(self):
+        q = "apa perbedaan mitosis dan meiosis secara singkat"
+        first = await self._ask(q)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(self.history), 2)  # history berubah setelah turn pertama
+
+        second = await self._ask(q)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(second["fallback_note"], "⚡ Cached")
+        self.assertEqual(second["text"], first["text"])
+
+    async def test_other_user_and_followups_miss(self):
+        q = "apa perbedaan mitosis dan meiosis secara singkat"
+        await self._ask(q)
+        await self._ask(q, user_id=8)
+        self.assertEqual(self.calls, 2)
+
+        followup = "jelaskan lagi yang tadi dengan contoh lengkap"
+        await self._ask(followup)
+        await self._ask(followup)
+        self.assertEqual(self.calls, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
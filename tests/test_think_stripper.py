@@ -0,0 +1,50 @@
+"""ThinkStripper (streaming) harus identik dengan strip_think_tags (batch)"""
+import random
+import unittest
+
+from core.handler import ThinkStripper, strip_think_tags
+
+_PIECES = [
+    "<think>", "</think>", "<thinking>", "</thinking>", "<thought>", "</thought>",
+    "<thi", "nk>", "</", "<", ">", "a", "jawab", " ", "\n", "\n\n\n", "x < y", "<b>",
+]
+
+
+def _stream(text, cuts):
+    s = ThinkStripper()
+    parts, prev = [], 0
+    for c in cuts:
+        parts.append(s.feed(text[prev:c]))
+        prev = c
+    parts.append(s.feed(text[prev:]))
+    return "".join(parts) + s.flush()
+
+
+class ThinkStripperTest(unittest.TestCase):
+    def assertMatchesBatch(self, text, cuts):
+        self.assertEqual(_stream(text, cuts), strip_think_tags(text), (text, cuts))
+
+    def test_split_tags(self):
+        cases = [
+            "<think>rahasia</think>Jawaban akhir",
+            "<thinking>a\nb</thinking>\n\nHalo",
+            "Halo <think>tidak ditutup sampai akhir",
+            "stray </think> close dan <thought>x</thought> blok",
+            "<think>a<thought>b</think>c</thought>d",
+            "<thi<think>x</think>nk> terbentuk setelah blok dibuang",
+            "  \n\n\n\nawal\n\n\n\ntengah \n\n\n ",
+        ]
+        for text in cases:
+            for size in range(1, len(text) + 1):
+                self.assertMatchesBatch(text, list(range(size, len(text), size)))
+
+    def test_randomized(self):
+        rng = random.Random(1234)
+        for _ in range(3000):
+            text = "".join(rng.choice(_PIECES) for _ in range(rng.randint(0, 25)))
+            cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 8)))) if len(text) > 1 else []
+            self.assertMatchesBatch(text, cuts)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,12 +3,12 @@ Utility Functions
 Search engines, formatters, and helpers
 """
 
-import aiohttp
 import asyncio
 import logging
 import re
 from typing import List, Dict, Optional
 from datetime import datetime
+from core.providers import get_session
 
 log = logging.getLogger(__name__)
 
@@ -105,7 +105,7 @@ class DuckDuckGoSearch:
             from duckduckgo_search import DDGS
             
             # Run in executor to not block
-            loop = asyncio.get_event_loop()
+            loop = asyncio.get_running_loop()
             
             def _search():
                 with DDGS() as ddgs:
@@ -131,26 +131,26 @@ class TavilySearch:
             return []
         
         try:
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    "api_key": self.api_key,
-                    "query": query,
-                    "max_results": max_results,
-                    "search_depth": "basic"
-                }
+            session = await get_session()
+            payload = {
+                "api_key": self.api_key,
+                "query": query,
+                "max_results": max_results,
+                "search_depth": "basic"
+            }
                 
-                async with session.post(self.endpoint, json=payload) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        results = []
-                        for r in data.get("results", []):
-                            results.append({
-                                "title": r.get("title", ""),
-                                "body": r.get("content", ""),
-                                "href": r.get("url", "")
-                            })
-                        return results
-                    return []
+            async with session.post(self.endpoint, json=payload) as resp:
+                if resp.status == 200:
+                    data = await resp.json()
+                    results = []
+                    for r in data.get("results", []):
+                        results.append({
+                            "title": r.get("title", ""),
+                            "body": r.get("content", ""),
+                            "href": r.get("url", "")
+                        })
+                    return results
+                return []
         except Exception as e:
             log.error(f"Tavily search error: {e}")
             return []
@@ -168,25 +168,25 @@ class BraveSearch:
             return []
         
         try:
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "Accept": "application/json",
-                    "X-Subscription-Token": self.api_key
-                }
-                params = {"q": query, "count": max_results}
+            session = await get_session()
+            headers = {
+                "Accept": "application/json",
+                "X-Subscription-Token": self.api_key
+            }
+            params = {"q": query, "count": max_results}
                 
-                async with session.get(self.endpoint, headers=headers, params=params) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        results = []
-                        for r in data.get("web", {}).get("results", []):
-                            results.append({
-                                "title": r.get("title", ""),
-                                "body": r.get("description", ""),
-                                "href": r.get("url", "")
-                            })
-                        return results
-                    return []
+            async with session.get(self.endpoint, headers=headers, params=params) as resp:
+                if resp.status == 200:
+                    data = await resp.json()
+                    results = []
+                    for r in data.get("web", {}).get("results", []):
+                        results.append({
+                            "title": r.get("title", ""),
+                            "body": r.get("description", ""),
+                            "href": r.get("url", "")
+                        })
+                    return results
+                return []
         except Exception as e:
             log.error(f"Brave search error: {e}")
             return []
@@ -204,25 +204,25 @@ class SerperSearch:
             return []
         
         try:
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "X-API-KEY": self.api_key,
-                    "Content-Type": "application/json"
-                }
-                payload = {"q": query, "num": max_results}
+            session = await get_session()
+            headers = {
+                "X-API-KEY": self.api_key,
+                "Content-Type": "application/json"
+            }
+            payload = {"q": query, "num": max_results}
                 
-                async with session.post(self.endpoint, headers=headers, json=payload) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        results = []
-                        for r in data.get("organic", []):
-                            results.append({
-                                "title": r.get("title", ""),
-                                "body": r.get("snippet", ""),
-                                "href": r.get("link", "")
-                            })
-                        return results
-                    return []
+            async with session.post(self.endpoint, headers=headers, json=payload) as resp:
+                if resp.status == 200:
+                    data = await resp.json()
+                    results = []
+                    for r in data.get("organic", []):
+                        results.append({
+                            "title": r.get("title", ""),
+                            "body": r.get("snippet", ""),
+                            "href": r.get("link", "")
+                        })
+                    return results
+                return []
         except Exception as e:
             log.error(f"Serper search error: {e}")
             return []
@@ -238,21 +238,21 @@ class JinaSearch:
             encoded = urllib.parse.quote(query)
             url = f"https://s.jina.ai/{encoded}"
             
-            async with aiohttp.ClientSession() as session:
-                headers = {"Accept": "application/json"}
-                async with session.get(url, headers=headers) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        # Jina returns different format
-                        results = []
-                        for r in data.get("data", [])[:5]:
-                            results.append({
-                                "title": r.get("title", ""),
-                                "body": r.get("content", "")[:300],
-                                "href": r.get("url", "")
-                            })
-                        return results
-                    return []
+            session = await get_session()
+            headers = {"Accept": "application/json"}
+            async with session.get(url, headers=headers) as resp:
+                if resp.status == 200:
+                    data = await resp.json()
+                    # Jina returns different format
+                    results = []
+                    for r in data.get("data", [])[:5]:
+                        results.append({
+                            "title": r.get("title", ""),
+                            "body": r.get("content", "")[:300],
+                            "href": r.get("url", "")
+                        })
+                    return results
+                return []
         except Exception as e:
             log.error(f"Jina search error: {e}")
             return []